@@ -1,12 +1,16 @@
 # from flask import request, jsonify 
 from flask import jsonify
-from config import app, conn
+from config import app
+from utils.db import conn
 from routes.users_routes import users_bp
 from routes.clothing_routes import clothing_bp
 from routes.donation_routes import donation_bp
 from routes.eco_points_routes import eco_points_bp
 from routes.exchange_routes import exchange_bp
 from routes.conversation_routes import conversation_bp
+from routes.events_routes import events_bp
+from routes.wishlist_routes import wishlist_bp
+from routes.media_routes import media_bp
 
 @app.route('/get_tables', methods=["GET"])
 def get_tables():
@@ -25,6 +29,9 @@ app.register_blueprint(donation_bp, url_prefix="/api")
 app.register_blueprint(eco_points_bp, url_prefix="/api")
 app.register_blueprint(exchange_bp, url_prefix="/api")
 app.register_blueprint(conversation_bp, url_prefix="/api")
+app.register_blueprint(events_bp, url_prefix="/api")
+app.register_blueprint(wishlist_bp, url_prefix="/api")
+app.register_blueprint(media_bp, url_prefix="/api")
 
 
 if __name__ == '__main__':
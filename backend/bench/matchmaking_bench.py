@@ -0,0 +1,96 @@
+"""Matchmaking index benchmark on a synthetic catalogue.
+
+    python -m bench.matchmaking_bench              10000 users
+    python -m bench.matchmaking_bench 50000        50000 users
+
+Builds a random graph of available items, pending requests and wishlists
+(no database needed), then reports the load time and per-call latency of
+wanted_from, wanted_by and suggestions.
+"""
+import random
+import statistics
+import sys
+import time
+from services.matchmaking import MatchIndex
+
+CATEGORIES = ("Tops", "Bottoms", "Dresses", "Outerwear", "Shoes", "Accessories", "Kids", "Sportswear")
+SIZES = ("XS", "S", "M", "L", "XL", None)
+ITEMS_PER_USER = 5
+WISHES_PER_USER = 3
+REQUESTS_PER_USER = 1
+SAMPLES = 200
+SEED = 42
+
+
+def generate(users, rng):
+    """(items, requests, wishes) rows shaped like MatchIndex.load() expects"""
+    items = [
+        {
+            "item_id": i,
+            "user_id": rng.randrange(users),
+            "category": rng.choice(CATEGORIES),
+            "size": rng.choice(SIZES),
+        }
+        for i in range(users * ITEMS_PER_USER)
+    ]
+    requests = []
+    for i in range(users * REQUESTS_PER_USER):
+        item = rng.choice(items)
+        requests.append({
+            "exchange_id": i,
+            "requester_id": rng.randrange(users),
+            "owner_id": item["user_id"],
+            "requested_item_id": item["item_id"],
+        })
+    wishes = [
+        {"user_id": user, "category": rng.choice(CATEGORIES), "size": rng.choice(SIZES)}
+        for user in range(users)
+        for _ in range(WISHES_PER_USER)
+    ]
+    return items, requests, wishes
+
+
+def timed(fn, args):
+    """Milliseconds per call of fn(arg) for each arg"""
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<14} p50 {statistics.median(samples):8.2f} ms   p99 {p99:8.2f} ms")
+
+
+def main(argv):
+    try:
+        users = int(argv[1]) if len(argv) > 1 else 10000
+    except ValueError:
+        print(__doc__)
+        return 2
+
+    rng = random.Random(SEED)
+    items, requests, wishes = generate(users, rng)
+    index = MatchIndex()
+    start = time.perf_counter()
+    index.load(items, requests, wishes)
+    print(
+        f"{users} users, {len(items)} items, {len(requests)} requests, {len(wishes)} wishes; "
+        f"loaded in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+    sample = [rng.randrange(users) for _ in range(SAMPLES)]
+    report("wanted_from", timed(index.wanted_from, sample))
+    report("wanted_by", timed(index.wanted_by, sample))
+    found = []
+    report("suggestions", timed(lambda u: found.append(len(index.suggestions(u))), sample))
+    print(f"suggestions    {statistics.mean(found):.1f} cycles per user on average")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
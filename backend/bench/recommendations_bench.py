@@ -0,0 +1,115 @@
+"""Recommendation index benchmark on a synthetic catalogue.
+
+    python -m bench.recommendations_bench              100000 items
+    python -m bench.recommendations_bench 500000       500000 items
+
+Items are drawn from latent styles, each with its own categories, sizes,
+colors, brands and title vocabulary, plus noise shared across styles. For
+sampled users whose history is TASTE_ITEMS items of one style, it reports
+precision@K (the share of recommendations from that style) and the
+latency of taste + top_k. No database needed.
+"""
+import random
+import statistics
+import sys
+import time
+from services.recommendations import ItemIndex
+
+STYLES = 20
+TASTE_ITEMS = 5
+K = 20
+SAMPLES = 500
+USERS = 10000
+# Chance that a field is taken from the item's style rather than at random
+STYLE_FIDELITY = 0.7
+SEED = 42
+
+CATEGORIES = ("Tops", "Bottoms", "Dresses", "Outerwear", "Shoes", "Accessories", "Kids", "Sportswear")
+SIZES = ("XS", "S", "M", "L", "XL")
+COLORS = ("black", "white", "red", "blue", "green", "beige", "grey", "pink", "brown", "navy")
+CONDITIONS = ("New", "Like New", "Good", "Fair")
+COMMON_WORDS = ("great", "worn", "soft", "cotton", "vintage", "classic", "casual", "warm", "light", "comfy")
+
+
+def make_styles(rng):
+    return [
+        {
+            "category": rng.sample(CATEGORIES, 2),
+            "size": rng.sample(SIZES, 2),
+            "color": rng.sample(COLORS, 2),
+            "brand": [f"brand{s}_{b}" for b in range(3)],
+            "words": [f"style{s}word{w}" for w in range(8)],
+        }
+        for s in range(STYLES)
+    ]
+
+
+def _pick(rng, style_values, all_values):
+    return rng.choice(style_values if rng.random() < STYLE_FIDELITY else all_values)
+
+
+def generate(count, rng):
+    """(item rows shaped like clothing_items, style of each item)"""
+    styles = make_styles(rng)
+    all_brands = [b for s in styles for b in s["brand"]]
+    rows, item_styles = [], []
+    for item_id in range(1, count + 1):
+        s = rng.randrange(STYLES)
+        style = styles[s]
+        words = [_pick(rng, style["words"], COMMON_WORDS) for _ in range(rng.randint(3, 8))]
+        rows.append({
+            "item_id": item_id,
+            "user_id": rng.randrange(USERS),
+            "category": _pick(rng, style["category"], CATEGORIES),
+            "size": _pick(rng, style["size"], SIZES),
+            "color": _pick(rng, style["color"], COLORS),
+            "brand": _pick(rng, style["brand"], all_brands),
+            "item_condition": rng.choice(CONDITIONS),
+            "title": " ".join(words[:3]),
+            "description": " ".join(words[3:]),
+            "item_status": "Available",
+        })
+        item_styles.append(s)
+    return rows, item_styles
+
+
+def main(argv):
+    try:
+        count = int(argv[1]) if len(argv) > 1 else 100000
+    except ValueError:
+        print(__doc__)
+        return 2
+
+    rng = random.Random(SEED)
+    rows, item_styles = generate(count, rng)
+    by_style = {}
+    for row, s in zip(rows, item_styles):
+        by_style.setdefault(s, []).append(row["item_id"])
+
+    index = ItemIndex()
+    start = time.perf_counter()
+    index.rebuild(rows)
+    print(
+        f"{count} items, {STYLES} styles; encoded in {time.perf_counter() - start:.1f} s, "
+        f"vectors {index.vectors.nbytes / 2 ** 20:.0f} MB"
+    )
+
+    precisions, latencies = [], []
+    for _ in range(SAMPLES):
+        s = rng.randrange(STYLES)
+        history = rng.sample(by_style[s], TASTE_ITEMS)
+        start = time.perf_counter()
+        taste = index.taste({item_id: 1.0 for item_id in history})
+        top = index.top_k(taste, K, exclude_owner=-1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        precisions.append(sum(item_styles[item_id - 1] == s for item_id, _ in top) / K)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"precision@{K}   {statistics.mean(precisions):.3f}")
+    print(f"latency        p50 {statistics.median(latencies):.2f} ms   p99 {p99:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,19 +1,56 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
-import mysql.connector
 import os
 from dotenv import load_dotenv
 
+# Load environment variables
+load_dotenv()
+
+from utils.db import init_db, acquire_connection, release_connection
+from middleware.etag import init_etags
+from middleware.metrics import init_metrics
+from utils.json_provider import FastJSONProvider
+from utils.media import MediaRequest
+from utils.migrations import run_migrations
+from services.ledger import start_maintenance_thread
+from services.recommendations import start_refresh_thread
+from services.jobs import start_workers
+from utils.jwt_utils import start_revocation_sync
+
 app = Flask(__name__)
+# Image uploads are streamed to disk and hashed while they are parsed
+app.request_class = MediaRequest
+# orjson-backed when installed; datetimes as ISO 8601, Decimals as numbers
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# Load environment variables
-load_dotenv()
+# Database connections are pooled and checked out per request (see utils/db.py)
+init_db(app)
+
+# Request latency, status and database metrics, served at /metrics.
+# Registered before the ETag hook so it records the final (e.g. 304) status.
+init_metrics(app)
+
+# ETags and Cache-Control on GET responses; If-None-Match answered with 304
+init_etags(app)
+
+# Apply pending schema migrations on startup when enabled (or run `python migrate.py`)
+if os.getenv("DB_AUTO_MIGRATE", "0") == "1":
+    _cnx = acquire_connection()
+    try:
+        run_migrations(_cnx)
+    finally:
+        release_connection(_cnx)
+
+# Roll eco-point snapshots forward and reconcile cached balances in the background
+start_maintenance_thread()
+
+# Mirror the shared token denylist, including logouts handled by other workers
+start_revocation_sync()
+
+# Keep the recommendation index current with new and changed items
+start_refresh_thread()
 
-# Database connection (using only `conn`)
-conn = mysql.connector.connect(
-    host=os.getenv("DB_HOST"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    database=os.getenv("DB_NAME")
-)
+# Run queued background jobs (ledger rewards, ...); set JOB_WORKERS=0 when
+# they run in separate `python worker.py` processes instead
+start_workers()
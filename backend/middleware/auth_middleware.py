@@ -3,8 +3,7 @@ from flask import request, jsonify
 from utils.jwt_utils import verify_token
 
 
-def token_required(f):
-    """Decorator to require authentication token"""
+def _authenticate(f, allow_query_token):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -17,6 +16,8 @@ def token_required(f):
                 token = auth_header.split(' ')[1]
             except IndexError:
                 return jsonify({'error': 'Invalid token format'}), 401
+        elif allow_query_token:
+            token = request.args.get('token')
         
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
@@ -36,3 +37,12 @@ def token_required(f):
     
     return decorated
 
+
+def token_required(f):
+    """Decorator to require authentication token"""
+    return _authenticate(f, allow_query_token=False)
+
+
+def stream_token_required(f):
+    """Like token_required, but also accepts ?token= (EventSource cannot set headers)"""
+    return _authenticate(f, allow_query_token=True)
@@ -0,0 +1,43 @@
+from flask import current_app, request
+
+# Every JSON read is revalidated; with an ETag that costs a 304 and no body
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def cache_control(value):
+    """Set the Cache-Control header sent with a view's GET responses"""
+
+    def decorator(f):
+        f.cache_control = value
+        return f
+
+    return decorator
+
+
+def not_modified(etag):
+    """True if the request's If-None-Match already names `etag`"""
+    return request.method in ("GET", "HEAD") and request.if_none_match.contains(etag)
+
+
+def add_validators(response):
+    """Add an ETag and Cache-Control to GET responses and answer If-None-Match"""
+    if request.method not in ("GET", "HEAD") or response.status_code not in (200, 304):
+        return response
+    # Streams (SSE, NDJSON exports) are never buffered to hash them
+    if response.is_streamed:
+        return response
+
+    view = current_app.view_functions.get(request.endpoint)
+    response.headers.setdefault(
+        "Cache-Control", getattr(view, "cache_control", DEFAULT_CACHE_CONTROL)
+    )
+    if response.status_code == 304:
+        return response
+
+    if not response.get_etag()[0]:
+        response.add_etag()
+    return response.make_conditional(request)
+
+
+def init_etags(app):
+    app.after_request(add_validators)
@@ -0,0 +1,121 @@
+import hmac
+import os
+import time
+from flask import Response, g, request
+from middleware.etag import cache_control
+from utils import metrics
+from utils.db import pool_stats
+from utils.jwt_utils import token_cache_stats
+from utils.pubsub import bus
+from utils.response_cache import response_cache
+
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LABELS = ("blueprint", "endpoint", "method")
+
+REQUEST_DURATION = metrics.Histogram(
+    "scep_request_duration_seconds",
+    "Time from request start until the response (or its stream) finished",
+    LABELS,
+)
+RESPONSES = metrics.Counter(
+    "scep_responses_total", "Responses by route and status code", LABELS + ("status",)
+)
+IN_FLIGHT = metrics.Gauge(
+    "scep_requests_in_flight", "Requests currently being handled", ("blueprint",)
+)
+DB_QUERIES = metrics.Histogram(
+    "scep_db_queries_per_request",
+    "Statements executed on the request's connection",
+    LABELS,
+    buckets=metrics.COUNT_BUCKETS,
+)
+DB_DURATION = metrics.Histogram(
+    "scep_db_duration_seconds",
+    "Time per request spent in database calls (execute, fetch, commit)",
+    LABELS,
+)
+
+
+def _route_labels():
+    # Unmatched URLs share one label so scanners cannot blow up cardinality
+    endpoint = request.endpoint or "unmatched"
+    return (request.blueprint or "app", endpoint, request.method)
+
+
+def start_timer():
+    g.metrics_start = time.perf_counter()
+    IN_FLIGHT.inc((request.blueprint or "app",))
+
+
+def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def observe_request(exception=None):
+    """Record a finished request.
+
+    Runs at teardown, which for streamed responses is after the last chunk,
+    so their duration and queries include the whole stream.
+    """
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    labels = _route_labels()
+    IN_FLIGHT.dec(labels[:1])
+    REQUEST_DURATION.observe(time.perf_counter() - start, labels)
+    status = g.pop("metrics_status", 500)
+    RESPONSES.inc(labels + (str(status),))
+    DB_QUERIES.observe(g.pop("db_queries", 0), labels)
+    DB_DURATION.observe(g.pop("db_time", 0.0), labels)
+
+
+def _collect():
+    """Pool, cache and subscriber state, read at scrape time"""
+    pool = pool_stats()
+    caches = {"response": response_cache.stats(), "token": token_cache_stats()}
+    return [
+        (
+            "scep_db_pool_connections", "gauge", "Pooled database connections by state",
+            {("in_use",): pool["in_use"], ("available",): pool["available"]}, ("state",),
+        ),
+        (
+            "scep_cache_hits_total", "counter", "Cache lookups that found an entry",
+            {(name,): s["hits"] for name, s in caches.items()}, ("cache",),
+        ),
+        (
+            "scep_cache_misses_total", "counter", "Cache lookups that found nothing",
+            {(name,): s["misses"] for name, s in caches.items()}, ("cache",),
+        ),
+        (
+            "scep_cache_hit_ratio", "gauge", "Hits over lookups since the process started",
+            {(name,): s["hit_ratio"] for name, s in caches.items()}, ("cache",),
+        ),
+        (
+            "scep_pubsub_subscribers", "gauge", "Open event stream subscriptions",
+            {(): bus.subscriber_count()}, (),
+        ),
+    ]
+
+
+metrics.registry.add_collector(_collect)
+
+
+@cache_control("no-store")
+def metrics_view():
+    """Every metric in the Prometheus text exposition format"""
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def init_metrics(app):
+    """Register the request hooks and the /metrics endpoint on the app"""
+    app.before_request(start_timer)
+    app.after_request(record_status)
+    app.teardown_request(observe_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,53 @@
+"""Schema migration CLI.
+
+    python migrate.py            apply pending migrations
+    python migrate.py status     list applied and pending migrations
+    python migrate.py check      EXPLAIN route queries, fail on full table scans
+"""
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.db import acquire_connection, release_connection
+from utils.migrations import (
+    applied_versions,
+    check_query_plans,
+    discover_migrations,
+    run_migrations,
+)
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "upgrade"
+    cnx = acquire_connection()
+    try:
+        if command == "upgrade":
+            applied = run_migrations(cnx)
+            if not applied:
+                print("Schema is up to date")
+            return 0
+
+        if command == "status":
+            done = applied_versions(cnx)
+            for version, _ in discover_migrations():
+                print(f"[{'x' if version in done else ' '}] {version}")
+            return 0
+
+        if command == "check":
+            problems = check_query_plans(cnx)
+            for name, table in problems:
+                print(f"FULL SCAN: {name} scans `{table}` without an index")
+            if problems:
+                return 1
+            print("All route queries use an index")
+            return 0
+
+        print(__doc__)
+        return 2
+    finally:
+        release_connection(cnx)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,92 @@
+-- Base schema for the clothing exchange platform.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    phone VARCHAR(20) NULL,
+    eco_points INT NOT NULL DEFAULT 0,
+    UNIQUE KEY uq_users_email (email),
+    KEY idx_users_phone (phone)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS clothing_items (
+    item_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT NULL,
+    category ENUM('Men', 'Women', 'Kids', 'Unisex') NOT NULL,
+    brand VARCHAR(100) NULL,
+    size VARCHAR(20) NULL,
+    color VARCHAR(50) NULL,
+    pickup_location VARCHAR(255) NULL,
+    pickup_latitude DECIMAL(9, 6) NULL,
+    pickup_longitude DECIMAL(9, 6) NULL,
+    item_condition ENUM('New', 'Gently Used', 'Worn') NOT NULL,
+    image_url VARCHAR(512) NULL,
+    item_status ENUM('Available', 'Exchange', 'Donated') NOT NULL DEFAULT 'Available',
+    cost INT NOT NULL DEFAULT 0,
+    CONSTRAINT fk_clothing_items_user FOREIGN KEY (user_id) REFERENCES users (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS exchangerequest (
+    exchange_id INT AUTO_INCREMENT PRIMARY KEY,
+    requester_id INT NOT NULL,
+    owner_id INT NOT NULL,
+    requested_item_id INT NOT NULL,
+    offered_item_id INT NULL,
+    offerd_points INT NULL,
+    exchange_status ENUM('Pending', 'Accepted', 'Rejected') NOT NULL DEFAULT 'Pending',
+    request_date DATETIME NOT NULL,
+    approval_date DATETIME NULL,
+    CONSTRAINT fk_exchangerequest_requester FOREIGN KEY (requester_id) REFERENCES users (user_id),
+    CONSTRAINT fk_exchangerequest_owner FOREIGN KEY (owner_id) REFERENCES users (user_id),
+    CONSTRAINT fk_exchangerequest_requested_item FOREIGN KEY (requested_item_id)
+        REFERENCES clothing_items (item_id) ON DELETE CASCADE,
+    CONSTRAINT fk_exchangerequest_offered_item FOREIGN KEY (offered_item_id)
+        REFERENCES clothing_items (item_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS donation (
+    donation_id INT AUTO_INCREMENT PRIMARY KEY,
+    donor_id INT NOT NULL,
+    item_id INT NOT NULL,
+    recipient VARCHAR(255) NULL,
+    donation_date DATETIME NOT NULL,
+    CONSTRAINT fk_donation_donor FOREIGN KEY (donor_id) REFERENCES users (user_id),
+    CONSTRAINT fk_donation_item FOREIGN KEY (item_id)
+        REFERENCES clothing_items (item_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS eco_point_transaction (
+    transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    transaction_type ENUM('Earn', 'Spend') NOT NULL,
+    exchange_id INT NULL,
+    donation_id INT NULL,
+    points INT NOT NULL,
+    reason VARCHAR(255) NULL,
+    transaction_date DATETIME NOT NULL,
+    CONSTRAINT fk_eco_point_transaction_user FOREIGN KEY (user_id) REFERENCES users (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS Conversations (
+    conversation_id INT AUTO_INCREMENT PRIMARY KEY,
+    user1_id INT NOT NULL,
+    user2_id INT NOT NULL,
+    start_time DATETIME NOT NULL,
+    CONSTRAINT fk_conversations_user1 FOREIGN KEY (user1_id) REFERENCES users (user_id),
+    CONSTRAINT fk_conversations_user2 FOREIGN KEY (user2_id) REFERENCES users (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS Messages (
+    message_id INT AUTO_INCREMENT PRIMARY KEY,
+    conversation_id INT NOT NULL,
+    sender_id INT NOT NULL,
+    message_text TEXT NOT NULL,
+    timestamp DATETIME NOT NULL,
+    CONSTRAINT fk_messages_conversation FOREIGN KEY (conversation_id)
+        REFERENCES Conversations (conversation_id) ON DELETE CASCADE,
+    CONSTRAINT fk_messages_sender FOREIGN KEY (sender_id) REFERENCES users (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,3 @@
+-- Full-text index backing the `search` filter of GET /api/clothes.
+ALTER TABLE clothing_items
+    ADD FULLTEXT INDEX ft_clothing_items_title_description (title, description);
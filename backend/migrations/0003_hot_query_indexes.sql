@@ -0,0 +1,33 @@
+-- Composite indexes for the filters the route handlers run on every request.
+
+-- Owner listings and the owner/status checks in exchange and donation flows
+ALTER TABLE clothing_items
+    ADD INDEX idx_clothing_items_user_status (user_id, item_status);
+
+-- Duplicate pending-request check in create_exchange_request, and "sent" lists
+ALTER TABLE exchangerequest
+    ADD INDEX idx_exchangerequest_requester_item_status (requester_id, requested_item_id, exchange_status);
+
+-- "Received" exchange lists, newest first
+ALTER TABLE exchangerequest
+    ADD INDEX idx_exchangerequest_owner_date (owner_id, request_date);
+
+-- Conversation history in timestamp order
+ALTER TABLE Messages
+    ADD INDEX idx_messages_conversation_timestamp (conversation_id, timestamp);
+
+-- Transaction history, newest first
+ALTER TABLE eco_point_transaction
+    ADD INDEX idx_eco_point_transaction_user_date (user_id, transaction_date);
+
+-- Conversation lookup by participant pair; the reverse index serves the
+-- "user2_id = ?" side of participant filters
+ALTER TABLE Conversations
+    ADD INDEX idx_conversations_user1_user2 (user1_id, user2_id);
+
+ALTER TABLE Conversations
+    ADD INDEX idx_conversations_user2_user1 (user2_id, user1_id);
+
+-- Donation history, newest first
+ALTER TABLE donation
+    ADD INDEX idx_donation_donor_date (donor_id, donation_date);
@@ -0,0 +1,22 @@
+-- Materialize each conversation's latest message so the inbox is a single
+-- indexed read of Conversations instead of two subqueries per thread.
+
+ALTER TABLE Conversations
+    ADD COLUMN last_message_id INT NULL,
+    ADD COLUMN last_message_text TEXT NULL,
+    ADD COLUMN last_message_time DATETIME NULL;
+
+UPDATE Conversations c
+JOIN (
+    SELECT m.conversation_id, m.message_id, m.message_text, m.timestamp
+    FROM Messages m
+    JOIN (
+        SELECT conversation_id, MAX(message_id) AS message_id
+        FROM Messages
+        GROUP BY conversation_id
+    ) latest ON latest.message_id = m.message_id
+) lm ON lm.conversation_id = c.conversation_id
+SET c.last_message_id = lm.message_id,
+    c.last_message_text = lm.message_text,
+    c.last_message_time = lm.timestamp
+WHERE c.last_message_id IS NULL;
@@ -0,0 +1,38 @@
+-- Per-user read cursors with an incrementally maintained unread counter.
+
+CREATE TABLE IF NOT EXISTS conversation_reads (
+    user_id INT NOT NULL,
+    conversation_id INT NOT NULL,
+    last_read_message_id INT NOT NULL DEFAULT 0,
+    unread_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, conversation_id),
+    CONSTRAINT fk_conversation_reads_user FOREIGN KEY (user_id) REFERENCES users (user_id),
+    CONSTRAINT fk_conversation_reads_conversation FOREIGN KEY (conversation_id)
+        REFERENCES Conversations (conversation_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Message-id ordered access within a conversation (unread counts, id paging)
+ALTER TABLE Messages
+    ADD INDEX idx_messages_conversation_message (conversation_id, message_id);
+
+-- Seed cursors from the previous heuristic: everything up to a user's own
+-- latest message counts as read
+INSERT IGNORE INTO conversation_reads (user_id, conversation_id, last_read_message_id, unread_count)
+SELECT p.user_id, p.conversation_id,
+       COALESCE((SELECT MAX(m.message_id) FROM Messages m
+                 WHERE m.conversation_id = p.conversation_id
+                 AND m.sender_id = p.user_id), 0),
+       0
+FROM (
+    SELECT user1_id AS user_id, conversation_id FROM Conversations
+    UNION ALL
+    SELECT user2_id AS user_id, conversation_id FROM Conversations
+) p;
+
+UPDATE conversation_reads r
+SET r.unread_count = (
+    SELECT COUNT(*) FROM Messages m
+    WHERE m.conversation_id = r.conversation_id
+    AND m.sender_id != r.user_id
+    AND m.message_id > r.last_read_message_id
+);
@@ -0,0 +1,22 @@
+-- The transaction ledger becomes the source of truth for balances. Each user
+-- has a snapshot (balance up to last_transaction_id); the live balance is the
+-- snapshot plus the transactions after it.
+
+CREATE TABLE IF NOT EXISTS eco_point_snapshot (
+    user_id INT PRIMARY KEY,
+    balance INT NOT NULL,
+    last_transaction_id INT NOT NULL,
+    taken_at DATETIME NOT NULL,
+    CONSTRAINT fk_eco_point_snapshot_user FOREIGN KEY (user_id) REFERENCES users (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Delta-since-snapshot lookups
+ALTER TABLE eco_point_transaction
+    ADD INDEX idx_eco_point_transaction_user_id (user_id, transaction_id);
+
+-- Baseline: current balances cover every transaction recorded so far
+INSERT IGNORE INTO eco_point_snapshot (user_id, balance, last_transaction_id, taken_at)
+SELECT u.user_id, u.eco_points,
+       (SELECT COALESCE(MAX(transaction_id), 0) FROM eco_point_transaction),
+       NOW()
+FROM users u;
@@ -0,0 +1,4 @@
+-- "Sent" exchange lists, newest first; pairs with idx_exchangerequest_owner_date
+-- so each side of the unified list query is an index range read.
+ALTER TABLE exchangerequest
+    ADD INDEX idx_exchangerequest_requester_date (requester_id, request_date);
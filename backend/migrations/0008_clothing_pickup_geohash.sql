@@ -0,0 +1,15 @@
+-- Geohash of the pickup point for nearby-item search. A search circle is
+-- covered by at most four geohash prefixes, each an index range read, before
+-- the exact distance check runs on the few rows left.
+ALTER TABLE clothing_items
+    ADD COLUMN pickup_geohash VARCHAR(12) CHARACTER SET ascii COLLATE ascii_bin NULL
+    AFTER pickup_longitude;
+
+ALTER TABLE clothing_items
+    ADD INDEX idx_clothing_items_geohash (pickup_geohash);
+
+-- Rows with out-of-range coordinates stay NULL and are never matched
+UPDATE clothing_items
+SET pickup_geohash = ST_GeoHash(pickup_longitude, pickup_latitude, 12)
+WHERE pickup_latitude BETWEEN -90 AND 90
+  AND pickup_longitude BETWEEN -180 AND 180;
@@ -0,0 +1,12 @@
+-- What each user is looking for; read by the exchange matchmaking index.
+-- A NULL size matches every size in the category.
+
+CREATE TABLE IF NOT EXISTS wishlists (
+    wishlist_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    category ENUM('Men', 'Women', 'Kids', 'Unisex') NOT NULL,
+    size VARCHAR(20) NULL,
+    created_at DATETIME NOT NULL,
+    KEY idx_wishlists_user (user_id),
+    CONSTRAINT fk_wishlists_user FOREIGN KEY (user_id) REFERENCES users (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,23 @@
+-- Durable background job queue (services/jobs.py). Jobs are inserted in the
+-- same transaction as the write that needs them, so they exist only if it
+-- commits. Done rows are kept for JOB_RETENTION so idempotency keys keep
+-- rejecting duplicates for that long.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(64) NOT NULL,
+    payload JSON NOT NULL,
+    idempotency_key VARCHAR(191) NULL,
+    status ENUM('Pending', 'Running', 'Done', 'Failed') NOT NULL DEFAULT 'Pending',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL,
+    run_at DATETIME(3) NOT NULL,
+    locked_by VARCHAR(128) NULL,
+    locked_at DATETIME(3) NULL,
+    last_error TEXT NULL,
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    UNIQUE KEY uq_jobs_idempotency_key (idempotency_key),
+    -- Claiming (Pending by run_at), lease expiry (Running by run_at) and purging
+    KEY idx_jobs_status_run_at (status, run_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
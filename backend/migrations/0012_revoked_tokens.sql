@@ -0,0 +1,10 @@
+-- Shared token denylist (utils/jwt_utils.py). Every worker mirrors the rows
+-- in memory; a row is only deleted once its token has expired.
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    revocation_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    token_hash BINARY(32) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    UNIQUE KEY uq_revoked_tokens_hash (token_hash),
+    KEY idx_revoked_tokens_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
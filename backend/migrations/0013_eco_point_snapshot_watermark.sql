@@ -0,0 +1,4 @@
+-- MAX(last_transaction_id) is the snapshot job's watermark: it reads only
+-- the transactions after it, by primary key
+ALTER TABLE eco_point_snapshot
+    ADD INDEX idx_eco_point_snapshot_last_transaction (last_transaction_id);
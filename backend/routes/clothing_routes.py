@@ -1,9 +1,68 @@
 from flask import Blueprint, request, jsonify
-from config import conn
+from utils.db import conn
 from middleware.auth_middleware import token_required
+from middleware.etag import cache_control
+from services import ledger, matchmaking, recommendations
+from utils.response_cache import (
+    ALL_CLOTHES_TAG,
+    add_cache_tags,
+    cached_response,
+    category_tag,
+    invalidate_items,
+    item_tag,
+    user_tag,
+)
+from utils.streaming import iter_rows, ndjson_response, wants_ndjson
+from utils.media import add_image_variants, image_url as uploaded_image_url
+from utils.geo import (
+    DISTANCE_SQL,
+    KNN_START_RADIUS_KM,
+    KNN_GROWTH,
+    MAX_RADIUS_KM,
+    distance_cursor,
+    parse_distance_cursor,
+    pickup_geohash,
+    valid_coordinates,
+    within_radius_sql,
+)
+from utils.search import (
+    CLOTHING_MATCH,
+    build_boolean_query,
+    parse_relevance_cursor,
+    relevance_cursor,
+)
 
 clothing_bp = Blueprint("clothing_bp", __name__)
 
+# Columns a client may request through ?fields= on the listing endpoint
+LIST_FIELDS = [
+    "item_id",
+    "user_id",
+    "title",
+    "description",
+    "category",
+    "brand",
+    "size",
+    "color",
+    "pickup_location",
+    "pickup_latitude",
+    "pickup_longitude",
+    "item_condition",
+    "image_url",
+    "item_status",
+    "cost",
+]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DEFAULT_RECOMMENDATIONS = 20
+MAX_RECOMMENDATIONS = 100
+
+# Filterable columns counted by /clothes/facets
+FACETS = ["category", "size", "item_condition", "item_status"]
+# Facet results are invalidated on every item write, so they can live longer
+FACETS_CACHE_TTL = 300
+
 
 @clothing_bp.route("/add_cloth", methods=["POST"])
 @token_required
@@ -28,16 +87,26 @@ def addcloth():
         if not data.get(field):
             return jsonify({"error": f"'{field}' is required"}), 400
 
+    # An image uploaded through POST /images, referenced by its id
+    if data.get("image_id"):
+        image_url = uploaded_image_url(data["image_id"])
+        if not image_url:
+            return jsonify({"error": "Unknown image_id"}), 400
+
+    has_coordinates = pickup_latitude not in (None, "") and pickup_longitude not in (None, "")
+    if has_coordinates and not valid_coordinates(pickup_latitude, pickup_longitude):
+        return jsonify({"error": "Invalid pickup coordinates"}), 400
+
     try:
         cursor = conn.cursor()
 
         query = """
         INSERT INTO clothing_items (
             user_id, title, description, category, brand, size, color,
-            pickup_location, pickup_latitude, pickup_longitude,
+            pickup_location, pickup_latitude, pickup_longitude, pickup_geohash,
             item_condition, image_url, item_status
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
 
         values = (
@@ -51,6 +120,7 @@ def addcloth():
             pickup_location,
             pickup_latitude,
             pickup_longitude,
+            pickup_geohash(pickup_latitude, pickup_longitude),
             item_condition,
             image_url,
             item_status,
@@ -62,6 +132,9 @@ def addcloth():
         item_id = cursor.lastrowid
         cursor.close()
 
+        invalidate_items([{"item_id": item_id, "user_id": user_id, "category": category}])
+        matchmaking.publish_item(item_id, user_id, category, size, item_status)
+
         return (
             jsonify(
                 {"message": "Clothing item added successfully", "item_id": item_id}
@@ -97,6 +170,11 @@ def update_cloth(item_id):
 
     update_data = {k: v for k, v in data.items() if k in allowed_fields}
 
+    if data.get("image_id"):
+        update_data["image_url"] = uploaded_image_url(data["image_id"])
+        if not update_data["image_url"]:
+            return jsonify({"error": "Unknown image_id"}), 400
+
     if not update_data:
         return jsonify({"error": "No valid fields to update"}), 400
 
@@ -104,7 +182,12 @@ def update_cloth(item_id):
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute(
-            "SELECT user_id FROM clothing_items WHERE item_id = %s", (item_id,)
+            """
+            SELECT item_id, user_id, category, size, item_status,
+                   pickup_latitude, pickup_longitude
+            FROM clothing_items WHERE item_id = %s
+            """,
+            (item_id,),
         )
         item = cursor.fetchone()
 
@@ -119,6 +202,15 @@ def update_cloth(item_id):
                 403,
             )
 
+        if "pickup_latitude" in update_data or "pickup_longitude" in update_data:
+            lat = update_data.get("pickup_latitude", item["pickup_latitude"])
+            lng = update_data.get("pickup_longitude", item["pickup_longitude"])
+            has_coordinates = lat not in (None, "") and lng not in (None, "")
+            if has_coordinates and not valid_coordinates(lat, lng):
+                cursor.close()
+                return jsonify({"error": "Invalid pickup coordinates"}), 400
+            update_data["pickup_geohash"] = pickup_geohash(lat, lng)
+
         set_clause = ", ".join([f"{key} = %s" for key in update_data.keys()])
         values = list(update_data.values())
 
@@ -133,6 +225,13 @@ def update_cloth(item_id):
         conn.commit()
         cursor.close()
 
+        # A category change moves the item between listings: drop both
+        updated = {**item, **update_data}
+        invalidate_items([item, updated])
+        matchmaking.publish_item(
+            item_id, user_id, updated["category"], updated["size"], updated["item_status"]
+        )
+
         return jsonify({"message": "Clothing item updated successfully"}), 200
 
     except Exception as e:
@@ -141,17 +240,19 @@ def update_cloth(item_id):
 
 
 @clothing_bp.route("/cloth/<int:item_id>", methods=["GET"])
+@cache_control("public, no-cache")
+@cached_response(tags=lambda view_args, args: [item_tag(view_args["item_id"])])
 def get_cloth(item_id):
     """Get a single clothing item by ID (includes seller info)"""
     try:
         cursor = conn.cursor(dictionary=True)
 
-        query = """
+        query = f"""
         SELECT 
             c.*,
             u.user_id AS seller_user_id,
             u.name AS seller_name,
-            u.eco_points AS seller_eco_points
+            {ledger.balance_sql("u.user_id")} AS seller_eco_points
         FROM clothing_items c
         LEFT JOIN users u ON c.user_id = u.user_id
         WHERE c.item_id = %s
@@ -163,27 +264,109 @@ def get_cloth(item_id):
         if not item:
             return jsonify({"error": "Item not found"}), 404
 
+        # The embedded seller balance changes with the seller's ledger
+        add_cache_tags(user_tag(item["user_id"]))
         return jsonify({"item": item}), 200
 
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 
+def _listing_tags(view_args, args):
+    category = args.get("category")
+    return [category_tag(category) if category else ALL_CLOTHES_TAG]
+
+
 @clothing_bp.route("/clothes", methods=["GET"])
+@cache_control("public, no-cache")
+@cached_response(tags=_listing_tags)
 def get_clothes():
-    """Get all clothing items with optional filters"""
+    """Get clothing items with optional filters, full-text and nearby search, keyset-paginated"""
     try:
         category = request.args.get("category")
         statuses = request.args.get("item_status")
         exclude_user = request.args.get("exclude_user", type=int)
         size = request.args.get("size")
         search = request.args.get("search")
+        after = request.args.get("after")
+        sort = request.args.get("sort")
         limit = request.args.get("limit", type=int)
-
-        cursor = conn.cursor(dictionary=True)
-
-        query = "SELECT * FROM clothing_items WHERE 1=1"
+        fields = request.args.get("fields")
+        lat = request.args.get("lat", type=float)
+        lng = request.args.get("lng", type=float)
+        radius_km = request.args.get("radius_km", type=float)
+
+        # NDJSON streams every match unless a limit is given; JSON is paged
+        stream = wants_ndjson()
+        if not stream:
+            limit = max(1, min(DEFAULT_PAGE_SIZE if limit is None else limit, MAX_PAGE_SIZE))
+
+        if fields:
+            columns = [f.strip() for f in fields.split(",") if f.strip()]
+            invalid = [c for c in columns if c not in LIST_FIELDS]
+            if invalid:
+                return jsonify({"error": f"Unknown fields: {', '.join(invalid)}"}), 400
+            if "item_id" not in columns:
+                columns.insert(0, "item_id")
+        else:
+            columns = LIST_FIELDS
+
+        if (lat is None) != (lng is None):
+            return jsonify({"error": "lat and lng must be given together"}), 400
+        near = lat is not None
+        if near and not valid_coordinates(lat, lng):
+            return jsonify({"error": "lat must be in [-90, 90] and lng in [-180, 180]"}), 400
+        if radius_km is not None and (not near or radius_km <= 0):
+            return jsonify({"error": "radius_km must be positive and needs lat and lng"}), 400
+
+        ft_query = build_boolean_query(search) if search else None
+        if sort is None:
+            sort = "relevance" if ft_query else "newest"
+        if sort not in ("newest", "relevance", "distance"):
+            return jsonify({"error": "sort must be 'newest', 'relevance' or 'distance'"}), 400
+        if sort == "relevance" and not ft_query:
+            sort = "newest"
+        if sort == "distance" and not near:
+            return jsonify({"error": "sort=distance requires lat and lng"}), 400
+
+        select_list = ", ".join(columns)
         params = []
+        if ft_query:
+            select_list += f", {CLOTHING_MATCH} AS relevance"
+            params.append(ft_query)
+        if near:
+            select_list += f", {DISTANCE_SQL} AS distance_km"
+            params.extend([lng, lat])
+
+        query = f"SELECT {select_list} FROM clothing_items WHERE 1=1"
+
+        position = None
+        if after:
+            if sort == "relevance":
+                position = parse_relevance_cursor(after)
+                if not position:
+                    return jsonify({"error": "Invalid cursor"}), 400
+                query += (
+                    f" AND ({CLOTHING_MATCH} < %s"
+                    f" OR ({CLOTHING_MATCH} = %s AND item_id < %s))"
+                )
+                params.extend([ft_query, position[0], ft_query, position[0], position[1]])
+            elif sort == "distance":
+                position = parse_distance_cursor(after)
+                if not position:
+                    return jsonify({"error": "Invalid cursor"}), 400
+                query += (
+                    f" AND ({DISTANCE_SQL} > %s"
+                    f" OR ({DISTANCE_SQL} = %s AND item_id > %s))"
+                )
+                params.extend([lng, lat, position[0], lng, lat, position[0], position[1]])
+            else:
+                try:
+                    after_id = int(after)
+                except ValueError:
+                    return jsonify({"error": "Invalid cursor"}), 400
+                query += " AND item_id < %s"
+                params.append(after_id)
 
         if category:
             query += " AND category = %s"
@@ -203,25 +386,78 @@ def get_clothes():
             query += " AND size = %s"
             params.append(size)
 
-        if search:
-            query += " AND (title LIKE %s OR description LIKE %s)"
-            like_term = f"%{search}%"
-            params.extend([like_term, like_term])
-
-
-        query += " ORDER BY item_id DESC"
+        if ft_query:
+            query += f" AND {CLOTHING_MATCH}"
+            params.append(ft_query)
+        elif search:
+            # Terms too short for the full-text index: anchored prefix match
+            query += " AND title LIKE %s"
+            params.append(f"{search}%")
+
+        if sort == "relevance":
+            order_by = " ORDER BY relevance DESC, item_id DESC"
+        elif sort == "distance":
+            order_by = " ORDER BY distance_km ASC, item_id ASC"
+        else:
+            order_by = " ORDER BY item_id DESC"
+
+        def radius_query(radius):
+            if radius is None:
+                if sort != "distance":
+                    return query + order_by, list(params)
+                return query + " AND pickup_geohash IS NOT NULL" + order_by, list(params)
+            condition, radius_params = within_radius_sql(lat, lng, radius)
+            return query + f" AND {condition}" + order_by, params + radius_params
+
+        # Grid views load thumbnails rather than the full-size image
+        transform = add_image_variants if "image_url" in columns else None
+
+        if stream:
+            stream_query, stream_params = radius_query(radius_km)
+            if limit is not None:
+                stream_query += " LIMIT %s"
+                stream_params.append(max(1, limit))
+            return ndjson_response(iter_rows(stream_query, stream_params, transform=transform))
 
-        if limit:
-            query += " LIMIT %s"
-            params.append(limit)
-
-
-        cursor.execute(query, params)
-        items = cursor.fetchall()
+        cursor = conn.cursor(dictionary=True)
 
-        # print(items)
+        def fetch_page(radius):
+            page_query, page_params = radius_query(radius)
+            # Fetch one extra row to know whether another page exists
+            cursor.execute(page_query + " LIMIT %s", page_params + [limit + 1])
+            return cursor.fetchall()
+
+        if sort == "distance" and radius_km is None:
+            # k-nearest: widen the circle until it holds a full page. Every
+            # item inside it is considered, so the nearest ones are exact.
+            radius = KNN_START_RADIUS_KM
+            if position:
+                radius = max(radius, position[0] * 2)
+            while True:
+                items = fetch_page(radius)
+                if len(items) > limit or radius >= MAX_RADIUS_KM:
+                    break
+                radius = min(radius * KNN_GROWTH, MAX_RADIUS_KM)
+        else:
+            items = fetch_page(radius_km)
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        if transform:
+            items = [transform(item) for item in items]
+        if not has_more:
+            next_cursor = None
+        elif sort == "relevance":
+            next_cursor = relevance_cursor(items[-1])
+        elif sort == "distance":
+            next_cursor = distance_cursor(items[-1])
+        else:
+            next_cursor = items[-1]["item_id"]
 
-        return jsonify({"items": items, "count": len(items)}), 200
+        return (
+            jsonify({"items": items, "count": len(items), "next_cursor": next_cursor}),
+            200,
+        )
 
     except Exception as e:
         print("Unexpected error:", e)
@@ -232,6 +468,136 @@ def get_clothes():
             cursor.close()
 
 
+@clothing_bp.route("/clothes/facets", methods=["GET"])
+@cache_control("public, no-cache")
+@cached_response(tags=lambda view_args, args: [ALL_CLOTHES_TAG], ttl=FACETS_CACHE_TTL)
+def get_clothes_facets():
+    """Per-value counts for each catalogue facet under the current filters.
+
+    A facet's counts apply every filter except its own, so the UI can show
+    what choosing another value of that facet would return.
+    """
+    try:
+        search = request.args.get("search")
+        exclude_user = request.args.get("exclude_user", type=int)
+        lat = request.args.get("lat", type=float)
+        lng = request.args.get("lng", type=float)
+        radius_km = request.args.get("radius_km", type=float)
+
+        selected = {}
+        for facet in FACETS:
+            value = request.args.get(facet)
+            values = {v.strip() for v in value.split(",") if v.strip()} if value else None
+            selected[facet] = values or None
+
+        if radius_km is not None:
+            if lat is None or lng is None or radius_km <= 0 or not valid_coordinates(lat, lng):
+                return jsonify({"error": "radius_km must be positive and needs valid lat and lng"}), 400
+
+        # Facet filters are applied in Python over this one grouped result,
+        # so every facet's counts come from a single scan
+        query = f"""
+            SELECT {", ".join(FACETS)}, COUNT(*) AS total
+            FROM clothing_items
+            WHERE 1=1
+        """
+        params = []
+
+        if exclude_user is not None:
+            query += " AND user_id != %s"
+            params.append(exclude_user)
+
+        ft_query = build_boolean_query(search) if search else None
+        if ft_query:
+            query += f" AND {CLOTHING_MATCH}"
+            params.append(ft_query)
+        elif search:
+            query += " AND title LIKE %s"
+            params.append(f"{search}%")
+
+        if radius_km is not None:
+            condition, radius_params = within_radius_sql(lat, lng, radius_km)
+            query += f" AND {condition}"
+            params.extend(radius_params)
+
+        query += f" GROUP BY {', '.join(FACETS)}"
+
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        groups = cursor.fetchall()
+        cursor.close()
+
+        counts = {facet: {} for facet in FACETS}
+        matching = 0
+        for group in groups:
+            allowed = {
+                facet: selected[facet] is None or group[facet] in selected[facet]
+                for facet in FACETS
+            }
+            if all(allowed.values()):
+                matching += group["total"]
+            for facet in FACETS:
+                if all(allowed[other] for other in FACETS if other != facet):
+                    value = group[facet]
+                    counts[facet][value] = counts[facet].get(value, 0) + group["total"]
+
+        facets = {
+            facet: [
+                {"value": value, "count": count}
+                for value, count in sorted(values.items(), key=lambda kv: -kv[1])
+            ]
+            for facet, values in counts.items()
+        }
+        return jsonify({"facets": facets, "total": matching}), 200
+
+    except Exception as e:
+        print("Error computing facets:", e)
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+
+@clothing_bp.route("/clothes/recommended", methods=["GET"])
+@token_required
+def get_recommended_clothes():
+    """Available items most similar to what the current user lists, requests and receives"""
+    try:
+        user_id = request.current_user.get("user_id")
+        limit = request.args.get("limit", DEFAULT_RECOMMENDATIONS, type=int)
+        limit = max(1, min(limit, MAX_RECOMMENDATIONS))
+
+        cursor = conn.cursor(dictionary=True)
+        recommendations.ensure_loaded(cursor)
+        taste = recommendations.index.taste(recommendations.interaction_weights(cursor, user_id))
+
+        # Over-fetch: the index only learns about status changes on its
+        # periodic rebuild, so some candidates may have gone since
+        candidates = recommendations.index.top_k(taste, 2 * limit, exclude_owner=user_id)
+        if not candidates:
+            cursor.close()
+            return jsonify({"items": [], "count": 0}), 200
+
+        scores = dict(candidates)
+        placeholders = ", ".join(["%s"] * len(scores))
+        cursor.execute(
+            f"""
+            SELECT {", ".join(LIST_FIELDS)} FROM clothing_items
+            WHERE item_id IN ({placeholders}) AND item_status = 'Available'
+            """,
+            list(scores),
+        )
+        rows = {row["item_id"]: row for row in cursor.fetchall()}
+        cursor.close()
+
+        items = [
+            add_image_variants({**rows[item_id], "score": score})
+            for item_id, score in candidates
+            if item_id in rows
+        ][:limit]
+
+        return jsonify({"items": items, "count": len(items)}), 200
+
+    except Exception as e:
+        print("Error computing recommendations:", e)
+        return jsonify({"error": "Database error", "details": str(e)}), 500
 
 
 @clothing_bp.route("/cloth/<int:item_id>", methods=["DELETE"])
@@ -243,7 +609,8 @@ def delete_cloth(item_id):
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute(
-            "SELECT user_id FROM clothing_items WHERE item_id = %s", (item_id,)
+            "SELECT item_id, user_id, category FROM clothing_items WHERE item_id = %s",
+            (item_id,),
         )
         item = cursor.fetchone()
 
@@ -262,6 +629,9 @@ def delete_cloth(item_id):
         conn.commit()
         cursor.close()
 
+        invalidate_items([item])
+        matchmaking.publish_items_removed([item_id])
+
         return jsonify({"message": "Clothing item deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
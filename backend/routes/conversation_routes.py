@@ -1,58 +1,114 @@
 from flask import Blueprint, request, jsonify
-from config import conn
+from utils.db import conn
+from utils.db import release_db
+from utils.message_notifier import wait_for_message
+from utils.pubsub import bus, conversation_channel, publish_to_users
+from utils.streaming import iter_rows, ndjson_response, wants_ndjson
 from middleware.auth_middleware import token_required
 
 conversation_bp = Blueprint("conversation_bp", __name__)
 
+MAX_MESSAGE_PAGE = 200
+MAX_LONG_POLL_SECONDS = 30
+
+
+def _fetch_messages(cursor, conversation_id, since_id, before_id, limit):
+    """Fetch a page of messages in ascending id order"""
+    if before_id is not None:
+        # Backward paging: newest `limit` messages older than before_id
+        cursor.execute(
+            """
+            SELECT message_id, sender_id, message_text, timestamp
+            FROM Messages
+            WHERE conversation_id = %s AND message_id < %s
+            ORDER BY message_id DESC
+            LIMIT %s
+            """,
+            (conversation_id, before_id, limit)
+        )
+        return list(reversed(cursor.fetchall()))
+
+    cursor.execute(*_messages_after_query(conversation_id, since_id, limit))
+    return cursor.fetchall()
+
+
+def _messages_after_query(conversation_id, since_id, limit):
+    """Messages newer than since_id in ascending id order (all if limit is None)"""
+    query = """
+        SELECT message_id, sender_id, message_text, timestamp
+        FROM Messages
+        WHERE conversation_id = %s AND message_id > %s
+        ORDER BY message_id ASC
+    """
+    params = [conversation_id, since_id or 0]
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+def _format_message(msg, user_id):
+    return {
+        "id": msg["message_id"],
+        "text": msg["message_text"],
+        "is_self": msg["sender_id"] == user_id,
+        "created_at": msg["timestamp"],
+    }
+
 
 @conversation_bp.route("/messages", methods=["GET"])
 @token_required
 def get_messages():
-    """Get messages or conversation list"""
+    """Get the conversation list, or a conversation's messages.
+
+    Messages can be fetched incrementally with `since_id` (optionally
+    long-polling for up to `wait` seconds) or paged backwards with `before_id`.
+    With `Accept: application/x-ndjson` rows are streamed instead.
+    """
     try:
         user_id = request.current_user.get("user_id")
         list_mode = request.args.get("list") == "1"
-        conversation_id = request.args.get("conversation_id")
+        conversation_id = request.args.get("conversation_id", type=int)
+        since_id = request.args.get("since_id", type=int)
+        before_id = request.args.get("before_id", type=int)
+        limit = request.args.get("limit", type=int)
+        wait = request.args.get("wait", 0, type=float)
+
+        if limit is not None or before_id is not None:
+            limit = max(1, min(limit or MAX_MESSAGE_PAGE, MAX_MESSAGE_PAGE))
+        wait = max(0, min(wait, MAX_LONG_POLL_SECONDS))
+        stream = wants_ndjson()
         
         cursor = conn.cursor(dictionary=True)
         
         if list_mode:
+            # One index lookup per participant column; the last message is
+            # kept on the conversation row by send_message
             query = """
-            SELECT c.conversation_id,
-                   CASE 
-                       WHEN c.user1_id = %s THEN u2.user_id
-                       ELSE u1.user_id
-                   END as other_user_id,
-                   CASE 
-                       WHEN c.user1_id = %s THEN u2.name
-                       ELSE u1.name
-                   END as other_user_name,
-                   (SELECT message_text FROM Messages 
-                    WHERE conversation_id = c.conversation_id 
-                    ORDER BY timestamp DESC LIMIT 1) as last_message,
-                   (SELECT timestamp FROM Messages 
-                    WHERE conversation_id = c.conversation_id 
-                    ORDER BY timestamp DESC LIMIT 1) as last_message_time
+            SELECT c.conversation_id AS id, u.name AS name,
+                   COALESCE(c.last_message_text, '') AS last_message,
+                   c.last_message_time
+            FROM Conversations c
+            LEFT JOIN users u ON u.user_id = c.user2_id
+            WHERE c.user1_id = %s
+            UNION ALL
+            SELECT c.conversation_id AS id, u.name AS name,
+                   COALESCE(c.last_message_text, '') AS last_message,
+                   c.last_message_time
             FROM Conversations c
-            LEFT JOIN users u1 ON c.user1_id = u1.user_id
-            LEFT JOIN users u2 ON c.user2_id = u2.user_id
-            WHERE c.user1_id = %s OR c.user2_id = %s
+            LEFT JOIN users u ON u.user_id = c.user1_id
+            WHERE c.user2_id = %s
             ORDER BY last_message_time DESC
             """
-            cursor.execute(query, (user_id, user_id, user_id, user_id))
+            if stream:
+                cursor.close()
+                return ndjson_response(iter_rows(query, (user_id, user_id)))
+
+            cursor.execute(query, (user_id, user_id))
             conversations = cursor.fetchall()
             cursor.close()
-            
-            formatted_conversations = []
-            for conv in conversations:
-                formatted_conversations.append({
-                    "id": conv["conversation_id"],
-                    "name": conv["other_user_name"],
-                    "last_message": conv["last_message"] or "",
-                    "last_message_time": conv["last_message_time"].isoformat() if conv["last_message_time"] else None
-                })
-            
-            return jsonify(formatted_conversations), 200
+
+            return jsonify(conversations), 200
         
         elif conversation_id:
 
@@ -68,29 +124,29 @@ def get_messages():
             if not conversation:
                 cursor.close()
                 return jsonify({"error": "Conversation not found or access denied"}), 404
+
+            if stream:
+                cursor.close()
+                if before_id is not None:
+                    return jsonify({"error": "before_id is not supported for NDJSON"}), 400
+                query, params = _messages_after_query(conversation_id, since_id, limit)
+                return ndjson_response(
+                    iter_rows(query, params, transform=lambda msg: _format_message(msg, user_id))
+                )
             
-            cursor.execute(
-                """
-                SELECT message_id, sender_id, message_text, timestamp
-                FROM Messages
-                WHERE conversation_id = %s
-                ORDER BY timestamp ASC
-                """,
-                (conversation_id,)
-            )
-            messages = cursor.fetchall()
+            messages = _fetch_messages(cursor, conversation_id, since_id, before_id, limit)
             cursor.close()
+
+            if not messages and wait and before_id is None:
+                # Long-poll: give the connection back while we wait for a
+                # new message, then re-read (also covers other workers)
+                release_db()
+                wait_for_message(conversation_id, since_id or 0, wait)
+                cursor = conn.cursor(dictionary=True)
+                messages = _fetch_messages(cursor, conversation_id, since_id, None, limit)
+                cursor.close()
             
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append({
-                    "id": msg["message_id"],
-                    "text": msg["message_text"],
-                    "is_self": msg["sender_id"] == user_id,
-                    "created_at": msg["timestamp"].isoformat() if msg["timestamp"] else None
-                })
-            
-            return jsonify(formatted_messages), 200
+            return jsonify([_format_message(msg, user_id) for msg in messages]), 200
         else:
             cursor.close()
             return jsonify({"error": "Either 'list=1' or 'conversation_id' parameter is required"}), 400
@@ -119,7 +175,7 @@ def send_message():
         if conversation_id:
             cursor.execute(
                 """
-                SELECT conversation_id FROM Conversations
+                SELECT conversation_id, user1_id, user2_id FROM Conversations
                 WHERE conversation_id = %s AND (user1_id = %s OR user2_id = %s)
                 """,
                 (conversation_id, user_id, user_id)
@@ -129,6 +185,12 @@ def send_message():
             if not conversation:
                 cursor.close()
                 return jsonify({"error": "Conversation not found or access denied"}), 404
+
+            other_user_id = (
+                conversation["user2_id"]
+                if conversation["user1_id"] == user_id
+                else conversation["user1_id"]
+            )
         
         elif other_user_id:
             if other_user_id == user_id:
@@ -168,9 +230,45 @@ def send_message():
             (conversation_id, user_id, message_text)
         )
         message_id = cursor.lastrowid
+
+        cursor.execute(
+            """
+            UPDATE Conversations c
+            JOIN Messages m ON m.message_id = %s
+            SET c.last_message_id = m.message_id,
+                c.last_message_text = m.message_text,
+                c.last_message_time = m.timestamp
+            WHERE c.conversation_id = %s
+            -- Concurrent sends may take the row lock out of id order
+            AND (c.last_message_id IS NULL OR c.last_message_id < m.message_id)
+            """,
+            (message_id, conversation_id)
+        )
+
+        # Bump the recipient's unread counter
+        cursor.execute(
+            """
+            INSERT INTO conversation_reads (user_id, conversation_id, last_read_message_id, unread_count)
+            SELECT CASE WHEN c.user1_id = %s THEN c.user2_id ELSE c.user1_id END,
+                   c.conversation_id, 0, 1
+            FROM Conversations c
+            WHERE c.conversation_id = %s
+            ON DUPLICATE KEY UPDATE unread_count = unread_count + 1
+            """,
+            (user_id, conversation_id)
+        )
         conn.commit()
         cursor.close()
 
+        event = {
+            "type": "message",
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "sender_id": user_id,
+        }
+        bus.publish(conversation_channel(conversation_id), event)
+        publish_to_users([user_id, other_user_id], event)
+
         return jsonify({
             "id": message_id,
             "conversation_id": conversation_id,
@@ -191,43 +289,30 @@ def get_conversations():
         
         cursor = conn.cursor(dictionary=True)
         query = """
-        SELECT c.conversation_id,
-               CASE 
-                   WHEN c.user1_id = %s THEN u2.user_id
-                   ELSE u1.user_id
-               END as other_user_id,
-               CASE 
-                   WHEN c.user1_id = %s THEN u2.name
-                   ELSE u1.name
-               END as other_user_name,
-               c.start_time,
-               (SELECT COUNT(*) FROM Messages 
-                WHERE conversation_id = c.conversation_id 
-                AND sender_id != %s 
-                AND timestamp > COALESCE((SELECT MAX(timestamp) FROM Messages 
-                                         WHERE conversation_id = c.conversation_id 
-                                         AND sender_id = %s), '1970-01-01')) as unread_count
+        SELECT c.conversation_id AS id, u.user_id AS other_user_id,
+               u.name AS other_user_name, c.start_time,
+               COALESCE(r.unread_count, 0) AS unread_count
+        FROM Conversations c
+        LEFT JOIN users u ON u.user_id = c.user2_id
+        LEFT JOIN conversation_reads r
+               ON r.user_id = c.user1_id AND r.conversation_id = c.conversation_id
+        WHERE c.user1_id = %s
+        UNION ALL
+        SELECT c.conversation_id AS id, u.user_id AS other_user_id,
+               u.name AS other_user_name, c.start_time,
+               COALESCE(r.unread_count, 0) AS unread_count
         FROM Conversations c
-        LEFT JOIN users u1 ON c.user1_id = u1.user_id
-        LEFT JOIN users u2 ON c.user2_id = u2.user_id
-        WHERE c.user1_id = %s OR c.user2_id = %s
-        ORDER BY c.start_time DESC
+        LEFT JOIN users u ON u.user_id = c.user1_id
+        LEFT JOIN conversation_reads r
+               ON r.user_id = c.user2_id AND r.conversation_id = c.conversation_id
+        WHERE c.user2_id = %s
+        ORDER BY start_time DESC
         """
-        cursor.execute(query, (user_id, user_id, user_id, user_id, user_id, user_id))
+        cursor.execute(query, (user_id, user_id))
         conversations = cursor.fetchall()
         cursor.close()
-    
-        formatted_conversations = []
-        for conv in conversations:
-            formatted_conversations.append({
-                "id": conv["conversation_id"],
-                "other_user_id": conv["other_user_id"],
-                "other_user_name": conv["other_user_name"],
-                "start_time": conv["start_time"].isoformat() if conv["start_time"] else None,
-                "unread_count": conv["unread_count"] or 0
-            })
-        
-        return jsonify({"conversations": formatted_conversations}), 200
+
+        return jsonify({"conversations": conversations}), 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
@@ -278,3 +363,91 @@ def create_conversation(other_user_id):
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
+
+@conversation_bp.route("/conversations/<int:conversation_id>/read", methods=["POST"])
+@token_required
+def mark_conversation_read(conversation_id):
+    """Mark a conversation as read up to a message (defaults to the latest)"""
+    try:
+        user_id = request.current_user.get("user_id")
+        data = request.get_json(silent=True) or {}
+
+        cursor = conn.cursor(dictionary=True)
+        # Every read before the COUNT below is a locking read: the first plain
+        # read fixes the REPEATABLE READ snapshot, which must be taken after
+        # the conversation_reads row is locked or the COUNT could miss a
+        # message whose increment committed in between
+        cursor.execute(
+            """
+            SELECT conversation_id, last_message_id FROM Conversations
+            WHERE conversation_id = %s AND (user1_id = %s OR user2_id = %s)
+            FOR SHARE
+            """,
+            (conversation_id, user_id, user_id)
+        )
+        conversation = cursor.fetchone()
+
+        if not conversation:
+            cursor.close()
+            return jsonify({"error": "Conversation not found or access denied"}), 404
+
+        latest_message_id = conversation["last_message_id"] or 0
+        try:
+            last_read_message_id = int(data.get("last_read_message_id") or latest_message_id)
+        except (TypeError, ValueError):
+            cursor.close()
+            return jsonify({"error": "last_read_message_id must be an integer"}), 400
+        if last_read_message_id < 0:
+            cursor.close()
+            return jsonify({"error": "last_read_message_id must not be negative"}), 400
+        # The marker only moves forward, so it must never pass the newest message
+        last_read_message_id = min(last_read_message_id, latest_message_id)
+
+        # Lock the cursor row so a concurrent send_message increment is not lost
+        cursor.execute(
+            """
+            INSERT INTO conversation_reads (user_id, conversation_id, last_read_message_id, unread_count)
+            VALUES (%s, %s, 0, 0)
+            ON DUPLICATE KEY UPDATE user_id = user_id
+            """,
+            (user_id, conversation_id)
+        )
+        cursor.execute(
+            """
+            SELECT last_read_message_id FROM conversation_reads
+            WHERE user_id = %s AND conversation_id = %s
+            FOR UPDATE
+            """,
+            (user_id, conversation_id)
+        )
+        current = cursor.fetchone()
+        # Read cursors only move forward
+        last_read_message_id = max(last_read_message_id, current["last_read_message_id"])
+
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS unread FROM Messages
+            WHERE conversation_id = %s AND message_id > %s AND sender_id != %s
+            """,
+            (conversation_id, last_read_message_id, user_id)
+        )
+        unread_count = cursor.fetchone()["unread"]
+
+        cursor.execute(
+            """
+            UPDATE conversation_reads
+            SET last_read_message_id = %s, unread_count = %s
+            WHERE user_id = %s AND conversation_id = %s
+            """,
+            (last_read_message_id, unread_count, user_id, conversation_id)
+        )
+        conn.commit()
+        cursor.close()
+
+        return jsonify({
+            "conversation_id": conversation_id,
+            "last_read_message_id": last_read_message_id,
+            "unread_count": unread_count
+        }), 200
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
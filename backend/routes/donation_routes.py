@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
-from config import conn
+from utils.db import conn
 from middleware.auth_middleware import token_required
+from services import jobs, ledger, matchmaking
+from utils.response_cache import invalidate_items
+from utils.media import add_image_variants
 
 donation_bp = Blueprint("donation_bp", __name__)
 
@@ -14,7 +17,7 @@ def get_donations():
         cursor = conn.cursor(dictionary=True)
         
         query = """
-        SELECT d.donation_id, d.item_id, d.recipient, d.donation_date,
+        SELECT d.donation_id AS id, d.item_id, d.recipient, d.donation_date,
                ci.title, ci.description, ci.category, ci.image_url,
                ci.item_condition
         FROM donation d
@@ -24,30 +27,17 @@ def get_donations():
         """
         
         cursor.execute(query, (user_id,))
-        donations = cursor.fetchall()
+        donations = [add_image_variants(d) for d in cursor.fetchall()]
         cursor.close()
 
-        formatted_donations = []
-        for donation in donations:
-            formatted_donations.append({
-                "id": donation["donation_id"],
-                "item_id": donation["item_id"],
-                "title": donation["title"],
-                "description": donation["description"],
-                "category": donation["category"],
-                "recipient": donation["recipient"],
-                "donation_date": donation["donation_date"].isoformat() if donation["donation_date"] else None,
-                "image_url": donation["image_url"],
-                "item_condition": donation["item_condition"]
-            })
-
-        return jsonify({"donations": formatted_donations}), 200
+        return jsonify({"donations": donations}), 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 
 @donation_bp.route("/donations", methods=["POST"])
 @token_required
+@jobs.after_commit
 def create_donation():
     """Create a new donation"""
     try:
@@ -74,7 +64,7 @@ def create_donation():
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute(
-            "SELECT item_id, item_status FROM clothing_items WHERE item_id = %s AND user_id = %s",
+            "SELECT item_id, user_id, category, item_status FROM clothing_items WHERE item_id = %s AND user_id = %s",
             (item_id, user_id)
         )
         item = cursor.fetchone()
@@ -101,24 +91,20 @@ def create_donation():
             (item_id,)
         )
         
+        # Credited by a background job once the donation has committed
         points = 50 
-        cursor.execute(
-            """
-            INSERT INTO eco_point_transaction 
-            (user_id, transaction_type, donation_id, points, reason, transaction_date)
-            VALUES (%s, 'Earn', %s, %s, 'Donation', NOW())
-            """,
-            (user_id, donation_id, points)
-        )
-        
-        cursor.execute(
-            "UPDATE users SET eco_points = eco_points + %s WHERE user_id = %s",
-            (points, user_id)
+        ledger.defer_entries(
+            cursor,
+            [ledger.entry(user_id, "Earn", points, "Donation", donation_id=donation_id)],
+            idempotency_key=f"donation-reward:{donation_id}",
         )
         
         conn.commit()
         cursor.close()
 
+        invalidate_items([item])
+        matchmaking.publish_items_removed([item_id])
+
         return jsonify({
             "message": "Donation created successfully",
             "donation_id": donation_id,
@@ -137,7 +123,7 @@ def get_donation(donation_id):
         cursor = conn.cursor(dictionary=True)
         
         query = """
-        SELECT d.donation_id, d.item_id, d.recipient, d.donation_date,
+        SELECT d.donation_id AS id, d.item_id, d.recipient, d.donation_date,
                ci.title, ci.description, ci.category, ci.image_url,
                ci.item_condition, ci.brand, ci.size, ci.color
         FROM donation d
@@ -152,20 +138,7 @@ def get_donation(donation_id):
         if not donation:
             return jsonify({"error": "Donation not found"}), 404
 
-        return jsonify({
-            "id": donation["donation_id"],
-            "item_id": donation["item_id"],
-            "title": donation["title"],
-            "description": donation["description"],
-            "category": donation["category"],
-            "recipient": donation["recipient"],
-            "donation_date": donation["donation_date"].isoformat() if donation["donation_date"] else None,
-            "image_url": donation["image_url"],
-            "item_condition": donation["item_condition"],
-            "brand": donation["brand"],
-            "size": donation["size"],
-            "color": donation["color"]
-        }), 200
+        return jsonify(donation), 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
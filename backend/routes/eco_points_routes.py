@@ -1,9 +1,40 @@
-from flask import Blueprint, request, jsonify
-from config import conn
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.http import generate_etag
+from utils.db import conn
 from middleware.auth_middleware import token_required
+from middleware.etag import not_modified
+from services import ledger
+from utils.cache import TTLCache
+from utils.streaming import iter_rows, ndjson_response
 
 eco_points_bp = Blueprint("eco_points_bp", __name__)
 
+MAX_PAGE_SIZE = 200
+
+# Per-user transaction counts, reused across page clicks
+_transaction_totals = TTLCache(maxsize=10000, ttl=60)
+
+
+# Rows are selected in their response shape and serialized as they come
+TRANSACTION_COLUMNS = """
+    transaction_id AS id, transaction_type AS type, points, reason,
+    transaction_date AS date, exchange_id, donation_id
+"""
+
+
+def _encode_cursor(txn):
+    return f"{txn['date'].isoformat()},{txn['id']}"
+
+
+def _decode_cursor(value):
+    """Parse a "<transaction_date>,<transaction_id>" cursor; None if malformed"""
+    try:
+        date, transaction_id = value.rsplit(",", 1)
+        return datetime.fromisoformat(date), int(transaction_id)
+    except (AttributeError, ValueError):
+        return None
+
 
 @eco_points_bp.route("/eco_points", methods=["GET"])
 @token_required
@@ -16,9 +47,7 @@ def get_eco_points():
         user_id = request.current_user.get("user_id")
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("SELECT eco_points FROM users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
-        total_points = user["eco_points"] if user else 0
+        total_points = ledger.get_balance(cursor, user_id)
 
         
         
@@ -64,57 +93,98 @@ def get_eco_points():
 @eco_points_bp.route("/eco_points/transactions", methods=["GET"])
 @token_required
 def get_transactions():
-    """Get detailed transaction history with pagination"""
+    """Get transaction history, newest first, keyset-paginated on (date, id)"""
     try:
         user_id = request.current_user.get("user_id")
-        page = request.args.get("page", 1, type=int)
         limit = request.args.get("limit", 50, type=int)
-        offset = (page - 1) * limit
-        
+        after = request.args.get("cursor")
+        include_total = request.args.get("include_total") == "1"
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        query = f"""
+            SELECT {TRANSACTION_COLUMNS}
+            FROM eco_point_transaction
+            WHERE user_id = %s
+        """
+        params = [user_id]
+
+        if after:
+            position = _decode_cursor(after)
+            if not position:
+                return jsonify({"error": "Invalid cursor"}), 400
+            query += """
+            AND (transaction_date < %s OR (transaction_date = %s AND transaction_id < %s))
+            """
+            params.extend([position[0], position[0], position[1]])
+
+        query += " ORDER BY transaction_date DESC, transaction_id DESC LIMIT %s"
+        params.append(limit + 1)
+
         cursor = conn.cursor(dictionary=True)
-        
-        # Get total count
+
+        # The ledger is append-only, so the user's newest transaction id
+        # versions every page of their history
         cursor.execute(
-            "SELECT COUNT(*) as total FROM eco_point_transaction WHERE user_id = %s",
+            "SELECT MAX(transaction_id) AS latest FROM eco_point_transaction WHERE user_id = %s",
             (user_id,)
         )
-        total = cursor.fetchone()["total"]
-        
-        cursor.execute(
-            """
-            SELECT transaction_id, transaction_type, points, reason, transaction_date,
-                   exchange_id, donation_id
-            FROM eco_point_transaction
-            WHERE user_id = %s
-            ORDER BY transaction_date DESC
-            LIMIT %s OFFSET %s
-            """,
-            (user_id, limit, offset)
-        )
-        transactions = cursor.fetchall()
-        cursor.close()
+        latest = cursor.fetchone()["latest"] or 0
+        etag = generate_etag(f"{user_id}:{latest}:{request.query_string.decode()}".encode())
+        if not_modified(etag):
+            cursor.close()
+            not_modified_response = Response(status=304)
+            not_modified_response.set_etag(etag)
+            return not_modified_response
 
-        formatted_transactions = []
-        for txn in transactions:
-            formatted_transactions.append({
-                "id": txn["transaction_id"],
-                "type": txn["transaction_type"],
-                "points": txn["points"],
-                "reason": txn["reason"],
-                "date": txn["transaction_date"].isoformat() if txn["transaction_date"] else None,
-                "exchange_id": txn["exchange_id"],
-                "donation_id": txn["donation_id"]
-            })
+        cursor.execute(query, params)
+        transactions = cursor.fetchall()
 
-            # print(formatted_transactions)
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
 
-        return jsonify({
-            "transactions": formatted_transactions,
-            "total": total,
-            "page": page,
+        response = {
+            "transactions": transactions,
             "limit": limit,
-            "pages": (total + limit - 1) // limit
-        }), 200
+            "next_cursor": _encode_cursor(transactions[-1]) if has_more else None,
+        }
+
+        if include_total:
+            total = _transaction_totals.get(user_id)
+            if total is None:
+                cursor.execute(
+                    "SELECT COUNT(*) as total FROM eco_point_transaction WHERE user_id = %s",
+                    (user_id,)
+                )
+                total = cursor.fetchone()["total"]
+                _transaction_totals.set(user_id, total)
+            response["total"] = total
+
+        cursor.close()
+
+        response = jsonify(response)
+        response.set_etag(etag)
+        return response, 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
+
+@eco_points_bp.route("/eco_points/transactions/export", methods=["GET"])
+@token_required
+def export_transactions():
+    """Stream the user's full transaction history as NDJSON"""
+    user_id = request.current_user.get("user_id")
+
+    rows = iter_rows(
+        f"""
+        SELECT {TRANSACTION_COLUMNS}
+        FROM eco_point_transaction
+        WHERE user_id = %s
+        ORDER BY transaction_date DESC, transaction_id DESC
+        """,
+        (user_id,),
+    )
+    return ndjson_response(
+        rows,
+        headers={"Content-Disposition": "attachment; filename=eco_point_transactions.ndjson"},
+    )
@@ -0,0 +1,37 @@
+import json
+from flask import Blueprint, Response, request
+from middleware.auth_middleware import stream_token_required
+from utils.pubsub import bus, user_channel
+
+events_bp = Blueprint("events_bp", __name__)
+
+HEARTBEAT_SECONDS = 15
+
+
+@events_bp.route("/events", methods=["GET"])
+@stream_token_required
+def stream_events():
+    """Server-Sent Events stream of the current user's message and exchange events"""
+    user_id = request.current_user.get("user_id")
+    subscription = bus.subscribe([user_channel(user_id)])
+
+    def generate():
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            while True:
+                item = subscription.get(timeout=HEARTBEAT_SECONDS)
+                if item is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                _, event = item
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
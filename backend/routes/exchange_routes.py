@@ -1,133 +1,160 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify
-from config import conn
+from utils.db import conn
 from middleware.auth_middleware import token_required
+from utils.pubsub import publish_to_users
+from services import jobs, ledger, matchmaking
+from utils.streaming import iter_rows, ndjson_response, wants_ndjson
+from utils.media import add_image_variants
+from utils.response_cache import invalidate_items, response_cache, user_tag
 
 exchange_bp = Blueprint("exchange_bp", __name__)
 
 
+EXCHANGE_PAGE_SIZE = 50
+MAX_EXCHANGE_PAGE_SIZE = 200
+EXCHANGE_STATUSES = ("Pending", "Accepted", "Rejected")
+SUGGESTION_PAGE_SIZE = 20
+MAX_SUGGESTION_PAGE_SIZE = 50
+
+# Index-backed side of the exchange list for each participant role
+_SIDE_COLUMNS = {"sent": "requester_id", "received": "owner_id"}
+
+
+def _exchange_list_query(user_id, filter_type, status, position, fetch):
+    """Build the exchange list query for filter x status x keyset page.
+
+    Each participant side is a separate LIMITed range read on its
+    (<role>_id, request_date) index; "all" combines both with UNION ALL
+    instead of an OR that would defeat the indexes. Details are joined
+    onto the selected ids only, already in the response shape. At most
+    `fetch` rows are returned, or every match if it is None.
+    """
+    sides = ["sent", "received"] if filter_type == "all" else [filter_type]
+
+    branches = []
+    # partner_name and is_sent placeholders come first in the statement
+    params = [user_id, user_id]
+    for side in sides:
+        branch = f"""
+            SELECT exchange_id FROM exchangerequest
+            WHERE {_SIDE_COLUMNS[side]} = %s"""
+        params.append(user_id)
+        if status:
+            branch += " AND exchange_status = %s"
+            params.append(status)
+        if position:
+            branch += (
+                " AND (request_date < %s OR (request_date = %s AND exchange_id < %s))"
+            )
+            params.extend([position[0], position[0], position[1]])
+        if fetch is not None:
+            branch += " ORDER BY request_date DESC, exchange_id DESC LIMIT %s"
+            params.append(fetch)
+        branches.append(branch)
+
+    if len(branches) > 1:
+        source = " UNION ALL ".join(f"({branch})" for branch in branches)
+    else:
+        source = branches[0]
+
+    query = f"""
+        SELECT er.exchange_id AS id, er.requester_id, er.owner_id, er.requested_item_id,
+               er.offered_item_id, er.offerd_points AS offered_points,
+               er.exchange_status AS status, er.request_date, er.approval_date,
+               req_item.title as requested_title, req_item.image_url as requested_image,
+               req_item.category as requested_category,
+               off_item.title as offered_title, off_item.image_url as offered_image,
+               off_item.category as offered_category,
+               owner.name as owner_name, requester.name as requester_name,
+               IF(er.requester_id = %s, owner.name, requester.name) AS partner_name,
+               er.requester_id = %s AS is_sent
+        FROM ({source}) ids
+        JOIN exchangerequest er ON er.exchange_id = ids.exchange_id
+        LEFT JOIN clothing_items req_item ON er.requested_item_id = req_item.item_id
+        LEFT JOIN clothing_items off_item ON er.offered_item_id = off_item.item_id
+        LEFT JOIN users owner ON er.owner_id = owner.user_id
+        LEFT JOIN users requester ON er.requester_id = requester.user_id
+        ORDER BY er.request_date DESC, er.exchange_id DESC
+    """
+    if fetch is not None:
+        query += " LIMIT %s"
+        params.append(fetch)
+    return query, params
+
+
+def _format_exchange(req):
+    # MySQL returns comparisons as 0/1
+    req["is_sent"] = bool(req["is_sent"])
+    add_image_variants(req, "requested_image", "requested_")
+    add_image_variants(req, "offered_image", "offered_")
+    return req
+
+
+def _decode_exchange_cursor(value):
+    """Parse a "<request_date>,<exchange_id>" cursor; None if malformed"""
+    try:
+        date, exchange_id = value.rsplit(",", 1)
+        return datetime.fromisoformat(date), int(exchange_id)
+    except (AttributeError, ValueError):
+        return None
+
+
 @exchange_bp.route("/exchange", methods=["GET"])
 @token_required
 def get_exchange_requests():
-    """Get exchange requests (both sent and received)"""
+    """Get exchange requests (sent, received or all), optionally by status, keyset-paginated"""
     try:
         user_id = request.current_user.get("user_id")
         filter_type = request.args.get("filter", "all")  # all, sent, received
         status = request.args.get("status")
+        after = request.args.get("cursor")
+        limit = request.args.get("limit", type=int)
+
+        if filter_type not in ("all", "sent", "received"):
+            return jsonify({"error": "filter must be 'all', 'sent' or 'received'"}), 400
 
-        cursor = conn.cursor(dictionary=True)
         if status:
-            query = """
-            SELECT er.exchange_id AS id, req_item.title AS item_title, 
-                owner.name AS partner_name
-            FROM exchangerequest er
-            LEFT JOIN clothing_items req_item ON er.requested_item_id = req_item.item_id
-            LEFT JOIN users owner ON er.owner_id = owner.user_id
-            WHERE (er.requester_id = %s OR er.owner_id = %s)
-            AND er.exchange_status = %s
-            ORDER BY er.approval_date DESC
-            """
-            cursor.execute(query, (user_id, user_id, status.capitalize()))
-            exchanges = cursor.fetchall()
-            cursor.close()
-            # conn.close()
-            return jsonify({"exchanges": exchanges}), 200
-        
-        if filter_type == "sent":
-            query = """
-            SELECT er.exchange_id, er.requester_id, er.owner_id, er.requested_item_id,
-                   er.offered_item_id, er.offerd_points, er.exchange_status,
-                   er.request_date, er.approval_date,
-                   req_item.title as requested_title, req_item.image_url as requested_image,
-                   req_item.category as requested_category,
-                   off_item.title as offered_title, off_item.image_url as offered_image,
-                   off_item.category as offered_category,
-                   owner.name as owner_name, requester.name as requester_name
-            FROM exchangerequest er
-            LEFT JOIN clothing_items req_item ON er.requested_item_id = req_item.item_id
-            LEFT JOIN clothing_items off_item ON er.offered_item_id = off_item.item_id
-            LEFT JOIN users owner ON er.owner_id = owner.user_id
-            LEFT JOIN users requester ON er.requester_id = requester.user_id
-            WHERE er.requester_id = %s
-            ORDER BY er.request_date DESC
-            """
-            cursor.execute(query, (user_id,))
-        elif filter_type == "received":
-            query = """
-            SELECT er.exchange_id, er.requester_id, er.owner_id, er.requested_item_id,
-                   er.offered_item_id, er.offerd_points, er.exchange_status,
-                   er.request_date, er.approval_date,
-                   req_item.title as requested_title, req_item.image_url as requested_image,
-                   req_item.category as requested_category,
-                   off_item.title as offered_title, off_item.image_url as offered_image,
-                   off_item.category as offered_category,
-                   owner.name as owner_name, requester.name as requester_name
-            FROM exchangerequest er
-            LEFT JOIN clothing_items req_item ON er.requested_item_id = req_item.item_id
-            LEFT JOIN clothing_items off_item ON er.offered_item_id = off_item.item_id
-            LEFT JOIN users owner ON er.owner_id = owner.user_id
-            LEFT JOIN users requester ON er.requester_id = requester.user_id
-            WHERE er.owner_id = %s
-            ORDER BY er.request_date DESC
-            """
-            cursor.execute(query, (user_id,))
-        else:
-            query = """
-            SELECT er.exchange_id, er.requester_id, er.owner_id, er.requested_item_id,
-                   er.offered_item_id, er.offerd_points, er.exchange_status,
-                   er.request_date, er.approval_date,
-                   req_item.title as requested_title, req_item.image_url as requested_image,
-                   req_item.category as requested_category,
-                   off_item.title as offered_title, off_item.image_url as offered_image,
-                   off_item.category as offered_category,
-                   owner.name as owner_name, requester.name as requester_name
-            FROM exchangerequest er
-            LEFT JOIN clothing_items req_item ON er.requested_item_id = req_item.item_id
-            LEFT JOIN clothing_items off_item ON er.offered_item_id = off_item.item_id
-            LEFT JOIN users owner ON er.owner_id = owner.user_id
-            LEFT JOIN users requester ON er.requester_id = requester.user_id
-            WHERE er.requester_id = %s OR er.owner_id = %s
-            ORDER BY er.request_date DESC
-            """
-            cursor.execute(query, (user_id, user_id))
+            status = status.capitalize()
+            if status not in EXCHANGE_STATUSES:
+                return jsonify({"error": f"status must be one of {', '.join(EXCHANGE_STATUSES)}"}), 400
+
+        position = None
+        if after:
+            position = _decode_exchange_cursor(after)
+            if not position:
+                return jsonify({"error": "Invalid cursor"}), 400
 
+        # NDJSON streams every match unless a limit is given; JSON is paged
+        if wants_ndjson():
+            fetch = None if limit is None else max(1, limit)
+            query, params = _exchange_list_query(user_id, filter_type, status, position, fetch)
+            return ndjson_response(iter_rows(query, params, transform=_format_exchange))
+
+        limit = max(1, min(EXCHANGE_PAGE_SIZE if limit is None else limit, MAX_EXCHANGE_PAGE_SIZE))
+
+        # One extra row tells whether another page exists
+        query, params = _exchange_list_query(user_id, filter_type, status, position, limit + 1)
+
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
         requests = cursor.fetchall()
         cursor.close()
 
-        formatted_requests = []
-        for req in requests:
-            formatted_requests.append(
-                {
-                    "id": req["exchange_id"],
-                    "requester_id": req["requester_id"],
-                    "owner_id": req["owner_id"],
-                    "requester_name": req["requester_name"],
-                    "owner_name": req["owner_name"],
-                    "requested_item_id": req["requested_item_id"],
-                    "requested_title": req["requested_title"],
-                    "requested_image": req["requested_image"],
-                    "requested_category": req["requested_category"],
-                    "offered_item_id": req["offered_item_id"],
-                    "offered_title": req["offered_title"],
-                    "offered_image": req["offered_image"],
-                    "offered_category": req["offered_category"],
-                    "offered_points": req["offerd_points"],
-                    "status": req["exchange_status"],
-                    "request_date": (
-                        req["request_date"].isoformat() if req["request_date"] else None
-                    ),
-                    "approval_date": (
-                        req["approval_date"].isoformat()
-                        if req["approval_date"]
-                        else None
-                    ),
-                    "is_sent": req["requester_id"] == user_id,
-                }
-            )
+        has_more = len(requests) > limit
+        requests = requests[:limit]
+        next_cursor = (
+            f"{requests[-1]['request_date'].isoformat()},{requests[-1]['id']}"
+            if has_more
+            else None
+        )
 
-        return jsonify({"requests": formatted_requests}), 200
+        requests = [_format_exchange(req) for req in requests]
+
+        return jsonify({"requests": requests, "next_cursor": next_cursor}), 200
     except Exception as e:
         import traceback
-        print("❌ ERROR in accept_exchange:", traceback.format_exc())
+        print("❌ ERROR in get_exchange_requests:", traceback.format_exc())
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 
@@ -200,11 +227,7 @@ def create_exchange_request():
                 return jsonify({"error": "Offered item is not available"}), 400
 
         if offered_points and offered_points > 0:
-            cursor.execute(
-                "SELECT eco_points FROM users WHERE user_id = %s", (requester_id,)
-            )
-            user = cursor.fetchone()
-            if user["eco_points"] < offered_points:
+            if ledger.get_balance(cursor, requester_id) < offered_points:
                 cursor.close()
                 return jsonify({"error": "Insufficient eco points"}), 400
 
@@ -242,6 +265,14 @@ def create_exchange_request():
         conn.commit()
         cursor.close()
 
+        publish_to_users(
+            [requester_id, owner_id],
+            {"type": "exchange", "exchange_id": exchange_id, "status": "Pending"},
+        )
+        matchmaking.publish_request(
+            exchange_id, requester_id, owner_id, requested_item_id, pending=True
+        )
+
         return (
             jsonify(
                 {
@@ -257,6 +288,7 @@ def create_exchange_request():
 
 @exchange_bp.route("/exchange/<int:exchange_id>/accept", methods=["POST"])
 @token_required
+@jobs.after_commit
 def accept_exchange(exchange_id):
     """Accept an exchange request"""
     try:
@@ -264,17 +296,23 @@ def accept_exchange(exchange_id):
 
         cursor = conn.cursor(dictionary=True)
 
+        # Lock the exchange (and its items) so two concurrent accepts
+        # serialize and the second sees the updated status
         cursor.execute(
             """
             SELECT er.*, 
                    er.owner_id,
                    req_item.user_id as requested_item_owner,
+                   req_item.category as requested_item_category,
                    req_item.cost as requested_item_cost,
+                   off_item.user_id as offered_item_owner,
+                   off_item.category as offered_item_category,
                    off_item.cost as offered_item_cost
             FROM exchangerequest er
             JOIN clothing_items req_item ON er.requested_item_id = req_item.item_id
             LEFT JOIN clothing_items off_item ON er.offered_item_id = off_item.item_id
             WHERE er.exchange_id = %s
+            FOR UPDATE
             """,
             (exchange_id,),
         )
@@ -306,53 +344,27 @@ def accept_exchange(exchange_id):
                 400,
             )
 
+        # Status change for the request and both items in one statement
         cursor.execute(
             """
-            UPDATE exchangerequest
-            SET exchange_status = 'Accepted', approval_date = NOW()
-            WHERE exchange_id = %s
+            UPDATE exchangerequest er
+            JOIN clothing_items ci
+              ON ci.item_id IN (er.requested_item_id, er.offered_item_id)
+            SET er.exchange_status = 'Accepted', er.approval_date = NOW(),
+                ci.item_status = 'Exchange'
+            WHERE er.exchange_id = %s
             """,
             (exchange_id,),
         )
 
-        cursor.execute(
-            "UPDATE clothing_items SET item_status = 'Exchange' WHERE item_id = %s",
-            (exchange["requested_item_id"],),
-        )
-
-        if exchange["offered_item_id"]:
-            cursor.execute(
-                "UPDATE clothing_items SET item_status = 'Exchange' WHERE item_id = %s",
-                (exchange["offered_item_id"],),
-            )
-
-        if exchange["offerd_points"] and exchange["offerd_points"] > 0:
-            cursor.execute(
-                "UPDATE users SET eco_points = eco_points - %s WHERE user_id = %s",
-                (exchange["offerd_points"], exchange["requester_id"]),
+        entries = []
+        offered_points = exchange["offerd_points"] or 0
+        if offered_points > 0:
+            entries.append(
+                ledger.entry(exchange["requester_id"], "Spend", offered_points, "Exchange", exchange_id=exchange_id)
             )
-
-            cursor.execute(
-                "UPDATE users SET eco_points = eco_points + %s WHERE user_id = %s",
-                (exchange["offerd_points"], exchange["owner_id"]),
-            )
-
-            cursor.execute(
-                """
-                INSERT INTO eco_point_transaction
-                (user_id, transaction_type, exchange_id, points, reason, transaction_date)
-                VALUES (%s, 'Spend', %s, %s, 'Exchange', NOW())
-                """,
-                (exchange["requester_id"], exchange_id, exchange["offerd_points"]),
-            )
-
-            cursor.execute(
-                """
-                INSERT INTO eco_point_transaction
-                (user_id, transaction_type, exchange_id, points, reason, transaction_date)
-                VALUES (%s, 'Earn', %s, %s, 'Exchange', NOW())
-                """,
-                (exchange["owner_id"], exchange_id, exchange["offerd_points"]),
+            entries.append(
+                ledger.entry(exchange["owner_id"], "Earn", offered_points, "Exchange", exchange_id=exchange_id)
             )
 
         requested_cost = exchange.get("requested_item_cost") or 0
@@ -368,36 +380,50 @@ def accept_exchange(exchange_id):
         else:
             bonus_points = 0
 
-        if bonus_points > 0:
-            cursor.execute(
-                "UPDATE users SET eco_points = eco_points + %s WHERE user_id = %s",
-                (bonus_points, exchange["requester_id"]),
-            )
-            cursor.execute(
-                "UPDATE users SET eco_points = eco_points + %s WHERE user_id = %s",
-                (bonus_points, exchange["owner_id"]),
-            )
-
-            cursor.execute(
-                """
-                INSERT INTO eco_point_transaction
-                (user_id, transaction_type, exchange_id, points, reason, transaction_date)
-                VALUES (%s, 'Earn', %s, %s, 'Exchange Bonus (10% of value)', NOW())
-                """,
-                (exchange["requester_id"], exchange_id, bonus_points),
-            )
-            cursor.execute(
-                """
-                INSERT INTO eco_point_transaction
-                (user_id, transaction_type, exchange_id, points, reason, transaction_date)
-                VALUES (%s, 'Earn', %s, %s, 'Exchange Bonus (10% of value)', NOW())
-                """,
-                (exchange["owner_id"], exchange_id, bonus_points),
-            )
+        ledger.apply_entries(cursor, entries)
+
+        # The bonus is credited by a background job once the accept commits
+        ledger.defer_entries(
+            cursor,
+            [
+                ledger.entry(
+                    participant, "Earn", bonus_points,
+                    "Exchange Bonus (10% of value)", exchange_id=exchange_id,
+                )
+                for participant in (exchange["requester_id"], exchange["owner_id"])
+            ],
+            idempotency_key=f"exchange-bonus:{exchange_id}",
+        )
 
         conn.commit()
         cursor.close()
 
+        items = [{
+            "item_id": exchange["requested_item_id"],
+            "user_id": exchange["requested_item_owner"],
+            "category": exchange["requested_item_category"],
+        }]
+        if exchange["offered_item_id"]:
+            items.append({
+                "item_id": exchange["offered_item_id"],
+                "user_id": exchange["offered_item_owner"],
+                "category": exchange["offered_item_category"],
+            })
+        invalidate_items(items)
+        response_cache.invalidate(user_tag(exchange["requester_id"]), user_tag(exchange["owner_id"]))
+
+        publish_to_users(
+            [exchange["requester_id"], exchange["owner_id"]],
+            {"type": "exchange", "exchange_id": exchange_id, "status": "Accepted"},
+        )
+        matchmaking.publish_request(
+            exchange_id, exchange["requester_id"], exchange["owner_id"],
+            exchange["requested_item_id"], pending=False,
+        )
+        matchmaking.publish_items_removed(
+            [exchange["requested_item_id"], exchange["offered_item_id"]]
+        )
+
         return (
             jsonify(
                 {
@@ -454,22 +480,106 @@ def reject_exchange(exchange_id):
                 400,
             )
 
+        # Conditional on Pending: an accept that committed since the read
+        # above must not be flipped back to Rejected
         cursor.execute(
             """
             UPDATE exchangerequest
             SET exchange_status = 'Rejected', approval_date = NOW()
-            WHERE exchange_id = %s
+            WHERE exchange_id = %s AND exchange_status = 'Pending'
             """,
             (exchange_id,),
         )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            cursor.close()
+            return jsonify({"error": "Exchange request is no longer pending"}), 409
         conn.commit()
         cursor.close()
 
+        publish_to_users(
+            [exchange["requester_id"], exchange["owner_id"]],
+            {"type": "exchange", "exchange_id": exchange_id, "status": "Rejected"},
+        )
+        matchmaking.publish_request(
+            exchange_id, exchange["requester_id"], exchange["owner_id"],
+            exchange["requested_item_id"], pending=False,
+        )
+
         return jsonify({"message": "Exchange request rejected successfully"}), 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 
+@exchange_bp.route("/exchange/suggestions", methods=["GET"])
+@token_required
+def get_exchange_suggestions():
+    """Suggest mutual swaps and multi-party trade cycles for the current user.
+
+    In every suggestion each participant receives an item they asked for or
+    that matches their wishlist, from the next participant in the cycle.
+    """
+    try:
+        user_id = request.current_user.get("user_id")
+        max_length = request.args.get("max_length", 3, type=int)
+        limit = request.args.get("limit", SUGGESTION_PAGE_SIZE, type=int)
+
+        max_length = max(2, min(max_length, matchmaking.MAX_CYCLE_LENGTH))
+        limit = max(1, min(limit, MAX_SUGGESTION_PAGE_SIZE))
+
+        matchmaking.ensure_loaded()
+        cursor = conn.cursor(dictionary=True)
+        cycles = matchmaking.index.suggestions(user_id, max_length, limit)
+
+        item_ids = {t["item_id"] for cycle in cycles for t in cycle if t["item_id"]}
+        user_ids = {t["giver_id"] for cycle in cycles for t in cycle}
+
+        items = {}
+        if item_ids:
+            placeholders = ", ".join(["%s"] * len(item_ids))
+            cursor.execute(
+                f"""
+                SELECT item_id, title, image_url, category, size
+                FROM clothing_items WHERE item_id IN ({placeholders})
+                """,
+                list(item_ids),
+            )
+            items = {row["item_id"]: row for row in cursor.fetchall()}
+
+        names = {}
+        if user_ids:
+            placeholders = ", ".join(["%s"] * len(user_ids))
+            cursor.execute(
+                f"SELECT user_id, name FROM users WHERE user_id IN ({placeholders})",
+                list(user_ids),
+            )
+            names = {row["user_id"]: row["name"] for row in cursor.fetchall()}
+        cursor.close()
+
+        suggestions = [
+            {
+                "type": "swap" if len(cycle) == 2 else "cycle",
+                "length": len(cycle),
+                "trades": [
+                    {
+                        **trade,
+                        "giver_name": names.get(trade["giver_id"]),
+                        "receiver_name": names.get(trade["receiver_id"]),
+                        "item": items.get(trade["item_id"]),
+                    }
+                    for trade in cycle
+                ],
+            }
+            for cycle in cycles
+        ]
+
+        return jsonify({"suggestions": suggestions}), 200
+    except Exception as e:
+        import traceback
+        print("❌ ERROR in get_exchange_suggestions:", traceback.format_exc())
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+
 @exchange_bp.route("/exchange/<int:exchange_id>", methods=["GET"])
 @token_required
 def get_exchange(exchange_id):
@@ -480,7 +590,9 @@ def get_exchange(exchange_id):
         cursor = conn.cursor(dictionary=True)
 
         query = """
-        SELECT er.*, 
+        SELECT er.exchange_id AS id, er.requester_id, er.owner_id, er.requested_item_id,
+               er.offered_item_id, er.offerd_points AS offered_points,
+               er.exchange_status AS status, er.request_date, er.approval_date,
                req_item.title as requested_title, req_item.image_url as requested_image,
                req_item.category as requested_category, req_item.description as requested_description,
                off_item.title as offered_title, off_item.image_url as offered_image,
@@ -501,39 +613,6 @@ def get_exchange(exchange_id):
         if not exchange:
             return jsonify({"error": "Exchange request not found"}), 404
 
-        return (
-            jsonify(
-                {
-                    "id": exchange["exchange_id"],
-                    "requester_id": exchange["requester_id"],
-                    "owner_id": exchange["owner_id"],
-                    "requester_name": exchange["requester_name"],
-                    "owner_name": exchange["owner_name"],
-                    "requested_item_id": exchange["requested_item_id"],
-                    "requested_title": exchange["requested_title"],
-                    "requested_image": exchange["requested_image"],
-                    "requested_category": exchange["requested_category"],
-                    "requested_description": exchange["requested_description"],
-                    "offered_item_id": exchange["offered_item_id"],
-                    "offered_title": exchange["offered_title"],
-                    "offered_image": exchange["offered_image"],
-                    "offered_category": exchange["offered_category"],
-                    "offered_description": exchange["offered_description"],
-                    "offered_points": exchange["offerd_points"],
-                    "status": exchange["exchange_status"],
-                    "request_date": (
-                        exchange["request_date"].isoformat()
-                        if exchange["request_date"]
-                        else None
-                    ),
-                    "approval_date": (
-                        exchange["approval_date"].isoformat()
-                        if exchange["approval_date"]
-                        else None
-                    ),
-                }
-            ),
-            200,
-        )
+        return jsonify(exchange), 200
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
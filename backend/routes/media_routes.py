@@ -0,0 +1,56 @@
+from flask import Blueprint, abort, request, jsonify, send_from_directory
+from middleware.auth_middleware import token_required
+from utils.media import (
+    MEDIA_MAX_AGE,
+    MEDIA_ROOT,
+    HashingFile,
+    ImageBusy,
+    UnsupportedImage,
+    add_image_variants,
+    image_url,
+    is_media_path,
+    store_image,
+    sweep_stale_uploads,
+)
+
+media_bp = Blueprint("media_bp", __name__)
+
+
+@media_bp.route("/images", methods=["POST"])
+@token_required
+def upload_image():
+    """Upload an image (multipart field "image"); returns its id and URLs.
+
+    Temporary files of every part are removed when the request ends
+    (MediaRequest.close), whichever way it ends.
+    """
+    sweep_stale_uploads()
+    upload = request.files.get("image")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "An 'image' file is required"}), 400
+    if not isinstance(upload.stream, HashingFile):
+        return jsonify({"error": "Upload could not be processed"}), 500
+
+    try:
+        digest = store_image(upload.stream)
+    except UnsupportedImage as e:
+        return jsonify({"error": str(e)}), 400
+    except (ImageBusy, TimeoutError):
+        return jsonify({"error": "Image processing is busy, try again shortly"}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"Error storing image: {e}")
+        return jsonify({"error": "Image processing error", "details": str(e)}), 500
+
+    image = {"image_id": digest, "image_url": image_url(digest)}
+    return jsonify(add_image_variants(image)), 201
+
+
+@media_bp.route("/media/<path:filename>", methods=["GET"])
+def get_media(filename):
+    """Serve a stored image or variant; supports Range and conditional requests"""
+    if not is_media_path(filename):
+        abort(404)
+    response = send_from_directory(MEDIA_ROOT, filename, max_age=MEDIA_MAX_AGE)
+    # Content-addressed, so a URL's bytes never change
+    response.cache_control.immutable = True
+    return response
@@ -1,16 +1,28 @@
 from flask import Blueprint, request, jsonify
-from flask_bcrypt import Bcrypt
-from config import conn
-from utils.jwt_utils import generate_access_token, generate_refresh_token, verify_token
+from utils.db import conn, release_db
+from utils.passwords import HasherBusy, check_password, hash_password, needs_rehash
+from utils.jwt_utils import (
+    generate_access_token,
+    generate_refresh_token,
+    revoke_token,
+    verify_token,
+)
 from middleware.auth_middleware import token_required
+from services import ledger
+from utils.response_cache import cached_response, user_tag
+from utils.streaming import iter_rows, ndjson_response, wants_ndjson
 import re
 
 
-bcrypt = Bcrypt()
-
 users_bp = Blueprint("users_bp", __name__)
 
 
+def _hasher_busy_response():
+    response = jsonify({"error": "Server is busy, please retry shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @users_bp.route("/register", methods=["POST"])
 def register():
     try:
@@ -31,7 +43,7 @@ def register():
             cursor.close()
             return jsonify({"error": "User with this email already exists"}), 400
 
-        hashed_password = bcrypt.generate_password_hash(password).decode("utf-8")
+        hashed_password = hash_password(password)
 
         cursor.execute(
             """
@@ -67,6 +79,8 @@ def register():
             ),
             201,
         )
+    except HasherBusy:
+        return _hasher_busy_response()
     except Exception as e:
         return jsonify({"error": "Registration failed", "details": str(e)}), 500
 
@@ -90,14 +104,28 @@ def login():
 
         cursor.execute(query, (login_id,))
         user = cursor.fetchone()
+        if user:
+            user["eco_points"] = ledger.get_balance(cursor, user["user_id"])
         cursor.close()
+        # Don't hold a pooled connection while the hash is checked
+        release_db()
 
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        if not bcrypt.check_password_hash(user["password"], password):
+        if not check_password(user["password"], password):
             return jsonify({"error": "Invalid password"}), 401
 
+        # Upgrade hashes made with an older cost factor while we have the password
+        if needs_rehash(user["password"]):
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE users SET password = %s WHERE user_id = %s",
+                (hash_password(password), user["user_id"]),
+            )
+            conn.commit()
+            cursor.close()
+
         access_token = generate_access_token(user["user_id"], user["email"])
         refresh_token = generate_refresh_token(user["user_id"], user["email"])
 
@@ -122,6 +150,8 @@ def login():
             ),
             200,
         )
+    except HasherBusy:
+        return _hasher_busy_response()
     except Exception as e:
         return jsonify({"error": "Login failed", "details": str(e)}), 500
 
@@ -165,6 +195,24 @@ def refresh():
         return jsonify({"error": "Token refresh failed", "details": str(e)}), 500
 
 
+@users_bp.route("/logout", methods=["POST"])
+@token_required
+def logout():
+    """Revoke the current access token and, if given, the refresh token"""
+    try:
+        access_token = request.headers["Authorization"].split(" ")[1]
+        revoke_token(access_token)
+
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get("refresh_token")
+        if refresh_token:
+            revoke_token(refresh_token)
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+    return jsonify({"message": "Logged out successfully"}), 200
+
+
 @users_bp.route("/me", methods=["GET"])
 @token_required
 def get_current_user():
@@ -172,7 +220,12 @@ def get_current_user():
     user_id = request.current_user.get("user_id")
     cursor = conn.cursor(dictionary=True)
     cursor.execute(
-        "SELECT user_id, name, email, phone, eco_points FROM users WHERE user_id = %s",
+        f"""
+        SELECT u.user_id, u.name, u.email, u.phone,
+               {ledger.balance_sql("u.user_id")} AS eco_points
+        FROM users u
+        WHERE u.user_id = %s
+        """,
         (user_id,),
     )
     user = cursor.fetchone()
@@ -197,17 +250,41 @@ def get_current_user():
     )
 
 
+USER_ITEMS_QUERY = """
+    SELECT
+        item_id,
+        title,
+        description,
+        category,
+        brand,
+        size,
+        item_condition,
+        cost,
+        image_url
+    FROM clothing_items
+    WHERE user_id = %s
+    ORDER BY item_id DESC
+"""
+
+
+def _profile_lines(user, user_id):
+    yield {"user": user}
+    yield from iter_rows(USER_ITEMS_QUERY, (user_id,), transform=lambda item: {"item": item})
+
+
 @users_bp.route("/user/<int:user_id>", methods=["GET"])
+@cached_response(tags=lambda view_args, args: [user_tag(view_args["user_id"])])
 def get_user_by_id(user_id):
     try:
         cursor = conn.cursor(
             dictionary=True, buffered=True
         ) 
         cursor.execute(
-            """
-            SELECT user_id, name, email, phone, eco_points
-            FROM users
-            WHERE user_id = %s
+            f"""
+            SELECT u.user_id, u.name, u.email, u.phone,
+                   {ledger.balance_sql("u.user_id")} AS eco_points
+            FROM users u
+            WHERE u.user_id = %s
         """,
             (user_id,),
         )
@@ -217,25 +294,13 @@ def get_user_by_id(user_id):
             cursor.close()
             return jsonify({"error": "User not found"}), 404
 
+        if wants_ndjson():
+            # First line is the profile, then one line per listed item
+            cursor.close()
+            return ndjson_response(_profile_lines(user, user_id))
+
         cursor2 = conn.cursor(dictionary=True, buffered=True)
-        cursor2.execute(
-            """
-                SELECT 
-                    item_id,
-                    title,
-                    description,
-                    category,
-                    brand,
-                    size,
-                    item_condition,
-                    cost,
-                    image_url
-                FROM clothing_items
-                WHERE user_id = %s
-                ORDER BY item_id DESC  -- use item_id instead if you want newest first
-            """,
-            (user_id,),
-        )
+        cursor2.execute(USER_ITEMS_QUERY, (user_id,))
         items = cursor2.fetchall()
 
         cursor.close()
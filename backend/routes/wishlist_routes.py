@@ -0,0 +1,108 @@
+from flask import Blueprint, request, jsonify
+from utils.db import conn
+from middleware.auth_middleware import token_required
+from services.matchmaking import normalize_size, publish_wish
+
+wishlist_bp = Blueprint("wishlist_bp", __name__)
+
+CATEGORIES = ("Men", "Women", "Kids", "Unisex")
+MAX_WISHLIST_ENTRIES = 50
+
+
+@wishlist_bp.route("/wishlist", methods=["GET"])
+@token_required
+def get_wishlist():
+    """Get the current user's wishlist"""
+    try:
+        user_id = request.current_user.get("user_id")
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """
+            SELECT wishlist_id AS id, category, size, created_at
+            FROM wishlists
+            WHERE user_id = %s
+            ORDER BY wishlist_id DESC
+            """,
+            (user_id,)
+        )
+        entries = cursor.fetchall()
+        cursor.close()
+
+        return jsonify({"wishlist": entries}), 200
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+
+@wishlist_bp.route("/wishlist", methods=["POST"])
+@token_required
+def add_wishlist_entry():
+    """Add a category (and optionally a size) to the current user's wishlist"""
+    try:
+        user_id = request.current_user.get("user_id")
+        data = request.get_json() or {}
+        category = data.get("category")
+        size = normalize_size(data.get("size"))
+
+        if category not in CATEGORIES:
+            return jsonify({"error": f"category must be one of {', '.join(CATEGORIES)}"}), 400
+
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT wishlist_id, category, size FROM wishlists WHERE user_id = %s",
+            (user_id,)
+        )
+        entries = cursor.fetchall()
+
+        for entry in entries:
+            if entry["category"] == category and normalize_size(entry["size"]) == size:
+                cursor.close()
+                return jsonify({"error": "Already on your wishlist", "id": entry["wishlist_id"]}), 400
+
+        if len(entries) >= MAX_WISHLIST_ENTRIES:
+            cursor.close()
+            return jsonify({"error": f"A wishlist holds at most {MAX_WISHLIST_ENTRIES} entries"}), 400
+
+        cursor.execute(
+            """
+            INSERT INTO wishlists (user_id, category, size, created_at)
+            VALUES (%s, %s, %s, NOW())
+            """,
+            (user_id, category, size)
+        )
+        wishlist_id = cursor.lastrowid
+        conn.commit()
+        cursor.close()
+
+        publish_wish(user_id, category, size, active=True)
+
+        return jsonify({"message": "Added to wishlist", "id": wishlist_id}), 201
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+
+@wishlist_bp.route("/wishlist/<int:wishlist_id>", methods=["DELETE"])
+@token_required
+def delete_wishlist_entry(wishlist_id):
+    """Remove an entry from the current user's wishlist"""
+    try:
+        user_id = request.current_user.get("user_id")
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT category, size FROM wishlists WHERE wishlist_id = %s AND user_id = %s",
+            (wishlist_id, user_id)
+        )
+        entry = cursor.fetchone()
+
+        if not entry:
+            cursor.close()
+            return jsonify({"error": "Wishlist entry not found"}), 404
+
+        cursor.execute("DELETE FROM wishlists WHERE wishlist_id = %s", (wishlist_id,))
+        conn.commit()
+        cursor.close()
+
+        publish_wish(user_id, entry["category"], entry["size"], active=False)
+
+        return jsonify({"message": "Removed from wishlist"}), 200
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
@@ -0,0 +1,255 @@
+"""Background jobs backed by the `jobs` table.
+
+Routes do their transactional work, enqueue() the side effects into the same
+transaction and return; worker threads (or `python worker.py` processes) run
+the jobs afterwards. A job's handler writes through the worker's cursor and
+its completion is committed together with those writes, so each job's
+database effects apply exactly once even if a worker dies mid-run. Failed
+jobs are retried with exponential backoff up to their max_attempts.
+
+    @jobs.handler("ledger.apply_entries")
+    def apply(cursor, payload): ...
+
+    @route(...)
+    @jobs.after_commit
+    def view():
+        jobs.enqueue(cursor, "ledger.apply_entries", {...}, idempotency_key="...")
+        conn.commit()
+"""
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from functools import wraps
+from flask import g, has_request_context, make_response
+from utils.db import acquire_connection, release_connection
+from utils.pubsub import bus
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # threads per web process, 0 disables
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))  # seconds between idle polls
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_BASE = 5  # seconds before the first retry, doubled on each one
+JOB_BACKOFF_MAX = 3600
+JOB_LEASE = 300  # seconds a claimed job may run before another worker takes it over
+JOB_RETENTION = 7 * 24 * 3600  # seconds Done jobs (and their idempotency keys) are kept
+JOB_SWEEP_INTERVAL = 60  # seconds between lease-expiry / purge sweeps
+JOBS_CHANNEL = "jobs"
+
+_handlers = {}  # name -> (function, max_attempts)
+_wakeup = threading.Event()
+
+
+class UnknownJob(Exception):
+    """Raised when enqueuing a job no handler is registered for"""
+
+
+def handler(name, max_attempts=JOB_MAX_ATTEMPTS):
+    """Register `fn(cursor, payload)` as the handler for jobs called `name`.
+
+    The handler must not commit. It may return a callable, which is run once
+    its writes have committed (cache invalidation, publishing events).
+    """
+    def register(fn):
+        _handlers[name] = (fn, max_attempts)
+        return fn
+    return register
+
+
+def enqueue(cursor, name, payload, idempotency_key=None, delay=0):
+    """Add a job in the caller's transaction; it only exists if the caller commits.
+
+    A job whose idempotency_key is already queued (or ran within
+    JOB_RETENTION) is not added again, so retried requests do not repeat work.
+    """
+    if name not in _handlers:
+        raise UnknownJob(name)
+    cursor.execute(
+        """
+        INSERT INTO jobs (name, payload, idempotency_key, max_attempts, run_at, created_at)
+        VALUES (%s, %s, %s, %s, NOW(3) + INTERVAL %s SECOND, NOW())
+        ON DUPLICATE KEY UPDATE job_id = job_id
+        """,
+        (name, json.dumps(payload), idempotency_key, _handlers[name][1], int(delay)),
+    )
+    if has_request_context():
+        g.jobs_enqueued = True
+
+
+def notify():
+    """Wake idle workers in every process sharing the pub/sub backend"""
+    bus.publish(JOBS_CHANNEL, {"type": "enqueued"})
+
+
+def after_commit(view):
+    """Route decorator: wake the workers once the view has committed its jobs.
+
+    Jobs are only announced when the view succeeded; on errors the
+    request's transaction is rolled back with the jobs in it.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if g.pop("jobs_enqueued", False) and response.status_code < 400:
+            notify()
+        return response
+    return wrapper
+
+
+def _backoff(attempts):
+    """Seconds to wait before retry number `attempts`, with jitter"""
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    return int(delay * random.uniform(0.5, 1.0)) or 1
+
+
+def claim(cnx, worker_id):
+    """Lock the oldest due job for `worker_id` and commit; returns it or None.
+
+    SKIP LOCKED lets concurrent workers claim different jobs without waiting
+    on each other. While running, run_at holds the lease deadline.
+    """
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT job_id, name, payload, attempts, max_attempts FROM jobs
+            WHERE status = 'Pending' AND run_at <= NOW(3)
+            ORDER BY run_at LIMIT 1
+            FOR UPDATE SKIP LOCKED
+            """
+        )
+        job = cursor.fetchone()
+        if not job:
+            cnx.rollback()
+            return None
+        cursor.execute(
+            """
+            UPDATE jobs SET status = 'Running', attempts = attempts + 1,
+                locked_by = %s, locked_at = NOW(3), run_at = NOW(3) + INTERVAL %s SECOND
+            WHERE job_id = %s
+            """,
+            (worker_id, JOB_LEASE, job["job_id"]),
+        )
+        cnx.commit()
+        job["attempts"] += 1
+        return job
+    finally:
+        cursor.close()
+
+
+def _finish(cursor, job, worker_id, status, run_in=0, error=None):
+    """Record the outcome of a run, unless the lease was lost meanwhile"""
+    cursor.execute(
+        """
+        UPDATE jobs SET status = %s, run_at = NOW(3) + INTERVAL %s SECOND,
+            last_error = COALESCE(%s, last_error), locked_by = NULL,
+            finished_at = IF(%s IN ('Done', 'Failed'), NOW(), NULL)
+        WHERE job_id = %s AND status = 'Running' AND locked_by = %s AND attempts = %s
+        """,
+        (status, run_in, error, status, job["job_id"], worker_id, job["attempts"]),
+    )
+    return cursor.rowcount == 1
+
+
+def run_job(cnx, job, worker_id):
+    """Run a claimed job; its writes and completion commit together"""
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        fn, _ = _handlers[job["name"]]
+        payload = job["payload"]
+        on_commit = fn(cursor, json.loads(payload) if isinstance(payload, (str, bytes)) else payload)
+        if not _finish(cursor, job, worker_id, "Done"):
+            # Lease expired and another worker took the job over
+            cnx.rollback()
+            return False
+        cnx.commit()
+    except Exception as e:
+        cnx.rollback()
+        failed = job["attempts"] >= job["max_attempts"]
+        print(f"Job {job['job_id']} ({job['name']}) attempt {job['attempts']} failed: {e}")
+        if failed:
+            print(traceback.format_exc())
+        error = f"{type(e).__name__}: {e}"
+        if failed:
+            _finish(cursor, job, worker_id, "Failed", error=error)
+        else:
+            _finish(cursor, job, worker_id, "Pending", _backoff(job["attempts"]), error)
+        cnx.commit()
+        return False
+    finally:
+        cursor.close()
+
+    if on_commit:
+        try:
+            on_commit()
+        except Exception as e:
+            print(f"Job {job['job_id']} ({job['name']}) after-commit hook failed: {e}")
+    return True
+
+
+def sweep(cnx):
+    """Requeue jobs whose worker died mid-run and purge expired Done jobs"""
+    cursor = cnx.cursor()
+    try:
+        cursor.execute(
+            """
+            UPDATE jobs SET status = IF(attempts >= max_attempts, 'Failed', 'Pending'),
+                locked_by = NULL, last_error = 'Lease expired',
+                finished_at = IF(attempts >= max_attempts, NOW(), NULL)
+            WHERE status = 'Running' AND run_at < NOW(3)
+            """
+        )
+        expired = cursor.rowcount
+        cursor.execute(
+            "DELETE FROM jobs WHERE status = 'Done' AND run_at < NOW(3) - INTERVAL %s SECOND LIMIT 1000",
+            (JOB_RETENTION,),
+        )
+        cnx.commit()
+        if expired:
+            print(f"Jobs: requeued {expired} jobs whose lease expired")
+    finally:
+        cursor.close()
+
+
+def run_worker(stop=None):
+    """Claim and run jobs until `stop` (a threading.Event) is set"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+    last_sweep = 0.0
+    while stop is None or not stop.is_set():
+        ran = False
+        try:
+            cnx = acquire_connection()
+            try:
+                if time.monotonic() - last_sweep >= JOB_SWEEP_INTERVAL:
+                    last_sweep = time.monotonic()
+                    sweep(cnx)
+                job = claim(cnx, worker_id)
+                if job:
+                    run_job(cnx, job, worker_id)
+                    ran = True
+            finally:
+                release_connection(cnx)
+        except Exception as e:
+            print(f"Job worker error: {e}")
+        if not ran and _wakeup.wait(JOB_POLL_INTERVAL):
+            _wakeup.clear()
+
+
+def start_workers(count=JOB_WORKERS):
+    """Run `count` job workers in daemon threads"""
+    threads = []
+    for i in range(count):
+        thread = threading.Thread(target=run_worker, name=f"job-worker-{i}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _on_event(channel, event):
+    if channel == JOBS_CHANNEL:
+        _wakeup.set()
+
+
+bus.add_listener(_on_event)
@@ -0,0 +1,242 @@
+"""Eco-points ledger.
+
+eco_point_transaction is the append-only source of truth. A user's balance
+is their row in eco_point_snapshot plus the signed sum of the transactions
+recorded after it. Snapshots are rolled forward periodically, so a balance
+read touches at most one snapshot interval of transactions. users.eco_points
+is only a cached copy that the reconciler refreshes.
+
+Functions that take a cursor leave committing to the caller, so ledger
+writes join the caller's transaction. Rewards that need not be part of it
+(donation rewards, exchange bonuses) go through defer_entries() and are
+appended by a background job after the caller commits.
+"""
+import os
+import threading
+import time
+from services import jobs
+from utils.db import acquire_connection, release_connection
+from utils.response_cache import response_cache, user_tag
+
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "300"))  # seconds, 0 disables
+# Only fold transactions older than this into snapshots, so the settle step
+# in take_snapshots() rarely has to wait for a transaction still in flight
+LEDGER_SNAPSHOT_LAG = 60  # seconds
+LEDGER_LOCK = "scep_ledger_snapshot"
+APPLY_ENTRIES_JOB = "ledger.apply_entries"
+
+SIGNED_POINTS = "CASE WHEN t.transaction_type = 'Spend' THEN -t.points ELSE t.points END"
+
+
+def balance_sql(user_column):
+    """SQL expression for the live balance of the user in `user_column`"""
+    return f"""CAST(
+        COALESCE((SELECT s.balance FROM eco_point_snapshot s WHERE s.user_id = {user_column}), 0)
+        + COALESCE((
+            SELECT SUM({SIGNED_POINTS}) FROM eco_point_transaction t
+            WHERE t.user_id = {user_column}
+            AND t.transaction_id > COALESCE(
+                (SELECT s.last_transaction_id FROM eco_point_snapshot s WHERE s.user_id = {user_column}), 0)
+        ), 0)
+    AS SIGNED)"""
+
+
+def _scalar(row):
+    """First column of a row from either a dict or a tuple cursor"""
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def get_balance(cursor, user_id):
+    """Current balance of a user (0 for unknown users)"""
+    cursor.execute(
+        f"SELECT {balance_sql('u.user_id')} AS balance FROM users u WHERE u.user_id = %s",
+        (user_id,),
+    )
+    row = cursor.fetchone()
+    return int(_scalar(row) or 0) if row else 0
+
+
+def entry(user_id, transaction_type, points, reason, exchange_id=None, donation_id=None):
+    """Build a ledger entry; `points` is always positive, the type gives the sign"""
+    return {
+        "user_id": user_id,
+        "transaction_type": transaction_type,
+        "points": points,
+        "reason": reason,
+        "exchange_id": exchange_id,
+        "donation_id": donation_id,
+    }
+
+
+def apply_entries(cursor, entries):
+    """Append `entries` to the ledger in one multi-row INSERT.
+
+    Balances are derived from the ledger, so the hot users row is not touched.
+    """
+    entries = [e for e in entries if e["points"]]
+    if not entries:
+        return
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, NOW())"] * len(entries))
+    params = []
+    for e in entries:
+        params.extend([
+            e["user_id"], e["transaction_type"], e["exchange_id"],
+            e["donation_id"], e["points"], e["reason"],
+        ])
+    cursor.execute(
+        f"""
+        INSERT INTO eco_point_transaction
+        (user_id, transaction_type, exchange_id, donation_id, points, reason, transaction_date)
+        VALUES {placeholders}
+        """,
+        params,
+    )
+
+
+def defer_entries(cursor, entries, idempotency_key):
+    """Queue `entries` to be appended by a background job once the caller commits"""
+    entries = [e for e in entries if e["points"]]
+    if entries:
+        jobs.enqueue(cursor, APPLY_ENTRIES_JOB, {"entries": entries}, idempotency_key=idempotency_key)
+
+
+@jobs.handler(APPLY_ENTRIES_JOB)
+def _apply_entries_job(cursor, payload):
+    apply_entries(cursor, payload["entries"])
+    users = {e["user_id"] for e in payload["entries"]}
+    # Profiles show the live balance
+    return lambda: response_cache.invalidate(*(user_tag(u) for u in users))
+
+
+def snapshot_watermark(cursor):
+    """Id of the newest transaction folded into any snapshot.
+
+    Every transaction up to it is folded, so the next run only has to read
+    the transactions after it.
+    """
+    cursor.execute("SELECT COALESCE(MAX(last_transaction_id), 0) FROM eco_point_snapshot")
+    return int(_scalar(cursor.fetchone()) or 0)
+
+
+def take_snapshots(cursor, watermark):
+    """Roll snapshots forward over transactions settled since `watermark`.
+
+    Every lookup is a primary-key range read from the watermark, so a run
+    costs one snapshot interval of transactions regardless of history.
+    Returns the number of snapshots written.
+
+    A transaction can hold a lower auto-increment id and commit after higher
+    ones. Once the watermark passed it, balance_sql would never count it, so
+    the range is first read with FOR SHARE. That waits for rows still
+    uncommitted in it (or fails on lock wait timeout, leaving the watermark
+    for the next run), and the fold then sees every row in the range.
+    """
+    cursor.execute(
+        """
+        SELECT transaction_id FROM eco_point_transaction
+        WHERE transaction_id > %s AND transaction_date < NOW() - INTERVAL %s SECOND
+        ORDER BY transaction_id DESC LIMIT 1
+        """,
+        (watermark, LEDGER_SNAPSHOT_LAG),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return 0
+    high_water = _scalar(row)
+
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM eco_point_transaction
+        WHERE transaction_id > %s AND transaction_id <= %s
+        FOR SHARE
+        """,
+        (watermark, high_water),
+    )
+    cursor.fetchall()
+
+    cursor.execute(
+        f"""
+        INSERT INTO eco_point_snapshot (user_id, balance, last_transaction_id, taken_at)
+        SELECT t.user_id, COALESCE(s.balance, 0) + SUM({SIGNED_POINTS}),
+               MAX(t.transaction_id), NOW()
+        FROM eco_point_transaction t
+        LEFT JOIN eco_point_snapshot s ON s.user_id = t.user_id
+        WHERE t.transaction_id > %s AND t.transaction_id <= %s
+        GROUP BY t.user_id, s.balance
+        ON DUPLICATE KEY UPDATE
+            balance = VALUES(balance),
+            last_transaction_id = VALUES(last_transaction_id),
+            taken_at = VALUES(taken_at)
+        """,
+        (watermark, high_water),
+    )
+    return cursor.rowcount
+
+
+def reconcile(cursor, since=0):
+    """Fix cached users.eco_points that drifted from the ledger, in bulk.
+
+    Only users with transactions after `since` can have changed, so only
+    they are checked (since=0 checks everyone). Returns the number of
+    corrected users.
+    """
+    cursor.execute(
+        f"""
+        UPDATE users u
+        JOIN (
+            SELECT changed.user_id, {balance_sql("changed.user_id")} AS balance
+            FROM (
+                SELECT DISTINCT user_id FROM eco_point_transaction WHERE transaction_id > %s
+            ) changed
+        ) ledger ON ledger.user_id = u.user_id
+        SET u.eco_points = ledger.balance
+        WHERE u.eco_points != ledger.balance
+        """,
+        (since,),
+    )
+    return cursor.rowcount
+
+
+def run_maintenance():
+    """Snapshot and reconcile once; skipped if another worker holds the lock"""
+    cnx = acquire_connection()
+    try:
+        cursor = cnx.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LEDGER_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            cursor.close()
+            return
+        try:
+            watermark = snapshot_watermark(cursor)
+            snapshotted = take_snapshots(cursor, watermark)
+            cnx.commit()
+            drifted = reconcile(cursor, since=watermark)
+            cnx.commit()
+            if drifted:
+                print(f"Ledger reconcile: corrected cached balance for {drifted} users")
+            return snapshotted, drifted
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LEDGER_LOCK,))
+            cursor.fetchall()
+            cursor.close()
+    finally:
+        release_connection(cnx)
+
+
+def start_maintenance_thread(interval=LEDGER_SNAPSHOT_INTERVAL):
+    """Run run_maintenance() every `interval` seconds in a daemon thread"""
+    if interval <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_maintenance()
+            except Exception as e:
+                print(f"Ledger maintenance failed: {e}")
+
+    thread = threading.Thread(target=loop, name="ledger-maintenance", daemon=True)
+    thread.start()
+    return thread
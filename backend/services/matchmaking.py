@@ -0,0 +1,381 @@
+import heapq
+import os
+import threading
+import time
+from utils.db import acquire_connection, release_connection
+from utils.pubsub import bus
+
+# In-memory "who wants what from whom" index over available items, pending
+# exchange requests and wishlists, used to suggest mutual swaps and trade
+# cycles. Changes arrive as events on MATCHMAKING_CHANNEL, so with a shared
+# broker every worker's index follows writes made by the others; a periodic
+# full reload covers anything missed.
+
+MATCHMAKING_CHANNEL = "matchmaking"
+MATCHMAKING_RELOAD_INTERVAL = int(os.getenv("MATCHMAKING_RELOAD_INTERVAL", "600"))  # seconds
+MAX_CYCLE_LENGTH = 4
+# Partners considered at each hop of the search, best first
+FANOUT = 50
+# A pending request outweighs any number of wishlist matches
+REQUEST_WEIGHT = 1000
+
+
+def normalize_size(size):
+    size = (size or "").strip().upper()
+    return size or None
+
+
+class MatchIndex:
+    """Adjacency index between users, derived from what they want and own.
+
+    `u` wants from `v` when `v` owns an available item matching one of `u`'s
+    wishlist entries, or `u` has a pending request for one of `v`'s items.
+    Wishlist entries without a size match every size in their category.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changes = None  # events seen while a load is in progress
+        self.clear()
+
+    def clear(self):
+        self.items = {}  # item_id -> (owner, category, size)
+        # (category, size) and (category, None) -> {owner: set of item_id}
+        self.attr_owners = {}
+        self.wishes = {}  # user_id -> set of (category, size or None)
+        self.wishers = {}  # (category, size or None) -> set of user_id
+        self.requests = {}  # exchange_id -> (requester, owner, requested_item_id)
+        self.requested = {}  # requester -> {owner: {item_id: count}}
+        self.requesters = {}  # owner -> {requester: pending request count}
+        self.loaded_at = None
+
+    # -- maintenance -------------------------------------------------------
+
+    def begin_load(self):
+        """Record events from now on, to replay over the snapshot given to load()"""
+        with self._lock:
+            self._changes = []
+
+    def end_load(self):
+        with self._lock:
+            self._changes = None
+
+    def load(self, items, requests, wishes):
+        """Replace the index contents with full snapshots of the source rows.
+
+        Events recorded since begin_load() are applied again on top, so
+        writes that committed while the snapshot was read are not lost.
+        """
+        with self._lock:
+            self.clear()
+            for item in items:
+                self.add_item(item["item_id"], item["user_id"], item["category"], item["size"])
+            for req in requests:
+                self.add_request(
+                    req["exchange_id"], req["requester_id"], req["owner_id"], req["requested_item_id"]
+                )
+            for wish in wishes:
+                self.add_wish(wish["user_id"], wish["category"], wish["size"])
+            for event in self._changes or ():
+                self._apply(event)
+            self.loaded_at = time.monotonic()
+
+    def apply(self, event):
+        """Apply a MATCHMAKING_CHANNEL event"""
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append(event)
+            self._apply(event)
+
+    def _apply(self, event):
+        kind = event.get("type")
+        if kind == "item":
+            if event["available"]:
+                self.add_item(event["item_id"], event["user_id"], event["category"], event["size"])
+            else:
+                self.remove_item(event["item_id"])
+        elif kind == "request":
+            if event["pending"]:
+                self.add_request(
+                    event["exchange_id"], event["requester_id"], event["owner_id"], event["requested_item_id"]
+                )
+            else:
+                self.remove_request(event["exchange_id"])
+        elif kind == "wish":
+            if event["active"]:
+                self.add_wish(event["user_id"], event["category"], event["size"])
+            else:
+                self.remove_wish(event["user_id"], event["category"], event["size"])
+
+    def add_item(self, item_id, owner, category, size):
+        with self._lock:
+            self.remove_item(item_id)
+            size = normalize_size(size)
+            self.items[item_id] = (owner, category, size)
+            for attr in ((category, size), (category, None)):
+                self.attr_owners.setdefault(attr, {}).setdefault(owner, set()).add(item_id)
+
+    def remove_item(self, item_id):
+        with self._lock:
+            entry = self.items.pop(item_id, None)
+            if not entry:
+                return
+            owner, category, size = entry
+            for attr in ((category, size), (category, None)):
+                owners = self.attr_owners.get(attr, {})
+                owned = owners.get(owner)
+                if owned:
+                    owned.discard(item_id)
+                    if not owned:
+                        del owners[owner]
+
+    def add_request(self, exchange_id, requester, owner, item_id):
+        with self._lock:
+            if exchange_id in self.requests:
+                return
+            self.requests[exchange_id] = (requester, owner, item_id)
+            items = self.requested.setdefault(requester, {}).setdefault(owner, {})
+            items[item_id] = items.get(item_id, 0) + 1
+            requesters = self.requesters.setdefault(owner, {})
+            requesters[requester] = requesters.get(requester, 0) + 1
+
+    def remove_request(self, exchange_id):
+        with self._lock:
+            entry = self.requests.pop(exchange_id, None)
+            if not entry:
+                return
+            requester, owner, item_id = entry
+            owners = self.requested.get(requester, {})
+            items = owners.get(owner, {})
+            if items.get(item_id, 0) > 1:
+                items[item_id] -= 1
+            else:
+                items.pop(item_id, None)
+                if not items:
+                    owners.pop(owner, None)
+            requesters = self.requesters.get(owner, {})
+            if requesters.get(requester, 0) > 1:
+                requesters[requester] -= 1
+            else:
+                requesters.pop(requester, None)
+
+    def add_wish(self, user_id, category, size):
+        with self._lock:
+            attr = (category, normalize_size(size))
+            self.wishes.setdefault(user_id, set()).add(attr)
+            self.wishers.setdefault(attr, set()).add(user_id)
+
+    def remove_wish(self, user_id, category, size):
+        with self._lock:
+            attr = (category, normalize_size(size))
+            self.wishes.get(user_id, set()).discard(attr)
+            self.wishers.get(attr, set()).discard(user_id)
+
+    # -- queries -----------------------------------------------------------
+
+    def wanted_from(self, user_id):
+        """{owner: score} for every user `user_id` wants something from"""
+        scores = {}
+        for attr in self.wishes.get(user_id, ()):
+            for owner, items in self.attr_owners.get(attr, {}).items():
+                scores[owner] = scores.get(owner, 0) + len(items)
+        for owner, items in self.requested.get(user_id, {}).items():
+            if any(item_id in self.items for item_id in items):
+                scores[owner] = scores.get(owner, 0) + REQUEST_WEIGHT
+        scores.pop(user_id, None)
+        return scores
+
+    def wanted_by(self, user_id):
+        """{user: score} for every user who wants something `user_id` owns"""
+        scores = {}
+        # Mirrors wanted_from: (category, None) holds all of the user's items
+        # in the category (unsized ones included) and matches any-size
+        # wishes; sized keys match wishes for that size
+        for attr, owners in self.attr_owners.items():
+            items = owners.get(user_id)
+            if not items:
+                continue
+            for wisher in self.wishers.get(attr, ()):
+                scores[wisher] = scores.get(wisher, 0) + len(items)
+        for requester in self.requesters.get(user_id, {}):
+            items = self.requested.get(requester, {}).get(user_id, ())
+            if any(item_id in self.items for item_id in items):
+                scores[requester] = scores.get(requester, 0) + REQUEST_WEIGHT
+        scores.pop(user_id, None)
+        return scores
+
+    def wants(self, wanter, owner):
+        if any(i in self.items for i in self.requested.get(wanter, {}).get(owner, ())):
+            return True
+        return any(owner in self.attr_owners.get(attr, {}) for attr in self.wishes.get(wanter, ()))
+
+    def pick_item(self, wanter, owner):
+        """An item of `owner` that `wanter` wants, preferring requested ones"""
+        requested = [i for i in self.requested.get(wanter, {}).get(owner, ()) if i in self.items]
+        if requested:
+            return min(requested)
+        candidates = set()
+        for attr in self.wishes.get(wanter, ()):
+            candidates |= self.attr_owners.get(attr, {}).get(owner, set())
+        return min(candidates) if candidates else None
+
+    def suggestions(self, user_id, max_length=3, limit=20):
+        """Mutual swaps and trade cycles that give `user_id` something they want.
+
+        Each cycle is a list of users [user_id, v, ..., w] where every user
+        wants from the next and w wants from user_id; shorter cycles first.
+        Every hop only follows the FANOUT best-scored partners, which bounds
+        the search regardless of catalogue size.
+        """
+        with self._lock:
+            wanted_by = self.wanted_by(user_id)
+            if not wanted_by:
+                return []
+            targets = _top(wanted_by)
+            neighbours = {}
+
+            def partners(u):
+                if u not in neighbours:
+                    neighbours[u] = _top(self.wanted_from(u))
+                return neighbours[u]
+
+            suggestions = []
+            for length in range(2, max_length + 1):
+                for cycle in self._cycles(user_id, partners, wanted_by, targets, length):
+                    trades = self._trades(cycle)
+                    # Skip cycles where someone would receive nothing
+                    if any(t["item_id"] is None for t in trades):
+                        continue
+                    suggestions.append(trades)
+                    if len(suggestions) >= limit:
+                        return suggestions
+            return suggestions
+
+    def _cycles(self, user_id, partners, wanted_by, targets, length):
+        if length == 2:
+            for v in partners(user_id):
+                if v in wanted_by:
+                    yield [user_id, v]
+            return
+
+        stack = [[user_id, v] for v in reversed(partners(user_id))]
+        while stack:
+            path = stack.pop()
+            if len(path) == length - 1:
+                # Closing hop: a user who wants from user_id
+                for w in targets:
+                    if w not in path and self.wants(path[-1], w):
+                        yield path + [w]
+                continue
+            for nxt in reversed(partners(path[-1])):
+                if nxt not in path:
+                    stack.append(path + [nxt])
+
+    def _trades(self, cycle):
+        """Each user in the cycle receives an item from the next one"""
+        trades = []
+        for i, receiver in enumerate(cycle):
+            giver = cycle[(i + 1) % len(cycle)]
+            trades.append({
+                "giver_id": giver,
+                "receiver_id": receiver,
+                "item_id": self.pick_item(receiver, giver),
+            })
+        return trades
+
+
+def _top(scores, n=FANOUT):
+    return [user for user, _ in heapq.nlargest(n, scores.items(), key=lambda kv: (kv[1], -kv[0]))]
+
+
+index = MatchIndex()
+_load_lock = threading.Lock()
+
+
+def ensure_loaded():
+    """Load the index on first use and reload it every MATCHMAKING_RELOAD_INTERVAL.
+
+    One request does the (re)load. During a reload the others keep serving
+    the current index; before the first load they wait for it.
+    """
+    loaded_at = index.loaded_at
+    if loaded_at is not None and time.monotonic() - loaded_at < MATCHMAKING_RELOAD_INTERVAL:
+        return
+    if not _load_lock.acquire(blocking=loaded_at is None):
+        return
+    try:
+        loaded_at = index.loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < MATCHMAKING_RELOAD_INTERVAL:
+            return
+        _load()
+    finally:
+        _load_lock.release()
+
+
+def _load():
+    """Read all three tables in one snapshot taken after recording starts.
+
+    Writers publish after they commit, so every write missing from the
+    snapshot has its event recorded and replayed by index.load().
+    """
+    index.begin_load()
+    try:
+        cnx = acquire_connection()
+        try:
+            cnx.start_transaction(consistent_snapshot=True, readonly=True)
+            cursor = cnx.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT item_id, user_id, category, size FROM clothing_items WHERE item_status = 'Available'"
+            )
+            items = cursor.fetchall()
+            cursor.execute(
+                """
+                SELECT exchange_id, requester_id, owner_id, requested_item_id
+                FROM exchangerequest WHERE exchange_status = 'Pending'
+                """
+            )
+            requests = cursor.fetchall()
+            cursor.execute("SELECT user_id, category, size FROM wishlists")
+            wishes = cursor.fetchall()
+            cursor.close()
+        finally:
+            release_connection(cnx)
+        index.load(items, requests, wishes)
+    finally:
+        index.end_load()
+
+
+# Writers publish these after commit
+
+def publish_item(item_id, user_id, category, size, item_status):
+    bus.publish(MATCHMAKING_CHANNEL, {
+        "type": "item", "item_id": item_id, "user_id": user_id,
+        "category": category, "size": size, "available": item_status == "Available",
+    })
+
+
+def publish_items_removed(item_ids):
+    for item_id in item_ids:
+        if item_id:
+            bus.publish(MATCHMAKING_CHANNEL, {"type": "item", "item_id": item_id, "available": False})
+
+
+def publish_request(exchange_id, requester_id, owner_id, requested_item_id, pending):
+    bus.publish(MATCHMAKING_CHANNEL, {
+        "type": "request", "exchange_id": exchange_id, "requester_id": requester_id,
+        "owner_id": owner_id, "requested_item_id": requested_item_id, "pending": pending,
+    })
+
+
+def publish_wish(user_id, category, size, active):
+    bus.publish(MATCHMAKING_CHANNEL, {
+        "type": "wish", "user_id": user_id, "category": category, "size": size, "active": active,
+    })
+
+
+def _on_event(channel, event):
+    if channel == MATCHMAKING_CHANNEL:
+        index.apply(event)
+
+
+bus.add_listener(_on_event)
@@ -0,0 +1,263 @@
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from utils.db import acquire_connection, release_connection
+
+# Content-based recommendations. Every clothing item is encoded as a hashed
+# feature vector (category, size, color, brand, condition and title /
+# description tokens); a user's taste is the weighted mean of the items they
+# list, request and receive, and recommendations are the available items
+# with the highest cosine similarity to it, scored in one matrix product.
+
+RECOMMEND_DIMENSIONS = 128
+RECOMMEND_REFRESH_INTERVAL = int(os.getenv("RECOMMEND_REFRESH_INTERVAL", "60"))  # seconds, 0 disables
+RECOMMEND_REBUILD_INTERVAL = int(os.getenv("RECOMMEND_REBUILD_INTERVAL", "900"))  # seconds
+
+FIELD_WEIGHTS = {
+    "category": 2.0,
+    "size": 1.5,
+    "color": 1.0,
+    "brand": 1.0,
+    "item_condition": 0.5,
+}
+TEXT_WEIGHT = 1.0
+MIN_TOKEN_LENGTH = 3
+
+# How much each kind of interaction says about a user's taste
+LISTED_WEIGHT = 1.0
+DONATED_WEIGHT = 0.5
+REQUESTED_WEIGHT = 2.0
+RECEIVED_WEIGHT = 2.0
+
+ITEM_COLUMNS = (
+    "item_id, user_id, category, size, color, brand, item_condition,"
+    " title, description, item_status"
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _feature(name, value):
+    """(column, sign) of a hashed feature; the sign halves collision bias"""
+    h = zlib.crc32(f"{name}={value}".encode("utf-8"))
+    return h % RECOMMEND_DIMENSIONS, 1.0 if h & 0x80000000 else -1.0
+
+
+def encode_items(rows):
+    """Encode item rows as an L2-normalized float32 matrix, one row per item"""
+    rows_idx, cols, vals = [], [], []
+    for i, row in enumerate(rows):
+        for field, weight in FIELD_WEIGHTS.items():
+            value = (row.get(field) or "").strip().lower()
+            if value:
+                col, sign = _feature(field, value)
+                rows_idx.append(i)
+                cols.append(col)
+                vals.append(sign * weight)
+
+        text = f"{row.get('title') or ''} {row.get('description') or ''}".lower()
+        tokens = [t for t in _TOKEN_RE.findall(text) if len(t) >= MIN_TOKEN_LENGTH]
+        if tokens:
+            weight = TEXT_WEIGHT / len(tokens) ** 0.5
+            for token in tokens:
+                col, sign = _feature("token", token)
+                rows_idx.append(i)
+                cols.append(col)
+                vals.append(sign * weight)
+
+    matrix = np.zeros((len(rows), RECOMMEND_DIMENSIONS), dtype=np.float32)
+    np.add.at(matrix, (np.array(rows_idx, dtype=np.intp), np.array(cols, dtype=np.intp)), vals)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class ItemIndex:
+    """Item vectors in a growable matrix with per-row owner and availability"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset(0)
+        self.loaded_at = None
+
+    def _reset(self, capacity):
+        self.vectors = np.zeros((capacity, RECOMMEND_DIMENSIONS), dtype=np.float32)
+        self.item_ids = np.zeros(capacity, dtype=np.int64)
+        self.owners = np.zeros(capacity, dtype=np.int64)
+        self.available = np.zeros(capacity, dtype=bool)
+        self.count = 0
+        self.positions = {}  # item_id -> row
+        self.max_item_id = 0
+
+    def rebuild(self, rows):
+        """Replace the index with a full snapshot of clothing_items"""
+        vectors = encode_items(rows)
+        item_ids = np.fromiter((r["item_id"] for r in rows), dtype=np.int64, count=len(rows))
+        owners = np.fromiter((r["user_id"] for r in rows), dtype=np.int64, count=len(rows))
+        available = np.fromiter(
+            (r["item_status"] == "Available" for r in rows), dtype=bool, count=len(rows)
+        )
+        positions = {int(item_id): i for i, item_id in enumerate(item_ids)}
+        with self._lock:
+            self.vectors = vectors
+            self.item_ids = item_ids
+            self.owners = owners
+            self.available = available
+            self.count = len(rows)
+            self.positions = positions
+            self.max_item_id = int(item_ids.max()) if len(rows) else 0
+            self.loaded_at = time.monotonic()
+
+    def upsert(self, rows):
+        """Encode and add (or overwrite) a batch of item rows"""
+        if not rows:
+            return
+        matrix = encode_items(rows)
+        with self._lock:
+            for row, vector in zip(rows, matrix):
+                position = self.positions.get(row["item_id"])
+                if position is None:
+                    position = self._append_slot()
+                    self.positions[row["item_id"]] = position
+                self.vectors[position] = vector
+                self.item_ids[position] = row["item_id"]
+                self.owners[position] = row["user_id"]
+                self.available[position] = row["item_status"] == "Available"
+                self.max_item_id = max(self.max_item_id, row["item_id"])
+
+    def _append_slot(self):
+        if self.count == len(self.item_ids):
+            capacity = max(1024, len(self.item_ids) + len(self.item_ids) // 4)
+            for name in ("vectors", "item_ids", "owners", "available"):
+                old = getattr(self, name)
+                grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                grown[: self.count] = old[: self.count]
+                setattr(self, name, grown)
+        self.count += 1
+        return self.count - 1
+
+    def taste(self, weights):
+        """Weighted mean vector of the given {item_id: weight}, or None"""
+        with self._lock:
+            pairs = [(self.positions[i], w) for i, w in weights.items() if i in self.positions]
+            if not pairs:
+                return None
+            rows = np.fromiter((p for p, _ in pairs), dtype=np.intp, count=len(pairs))
+            w = np.fromiter((w for _, w in pairs), dtype=np.float32, count=len(pairs))
+            vector = w @ self.vectors[rows]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def top_k(self, taste, k, exclude_owner):
+        """Ids and scores of the k available items most similar to `taste`.
+
+        With no taste vector the newest available items are returned.
+        """
+        with self._lock:
+            n = self.count
+            candidates = self.available[:n] & (self.owners[:n] != exclude_owner)
+            if taste is None:
+                scores = self.item_ids[:n].astype(np.float64)
+            else:
+                scores = self.vectors[:n] @ taste
+            scores = np.where(candidates, scores, -np.inf)
+            item_ids = self.item_ids[:n].copy()
+
+        k = min(k, int(candidates.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if taste is None:
+            return [(int(item_ids[i]), None) for i in top]
+        return [(int(item_ids[i]), float(scores[i])) for i in top]
+
+
+index = ItemIndex()
+# Serializes loads and refreshes, so concurrent cold requests and the
+# background thread do not each read and encode the whole catalogue
+_refresh_lock = threading.Lock()
+
+
+def interaction_weights(cursor, user_id):
+    """{item_id: weight} of the items that describe a user's taste"""
+    cursor.execute(
+        """
+        SELECT item_id, IF(item_status = 'Donated', %s, %s) AS weight
+        FROM clothing_items WHERE user_id = %s
+        UNION ALL
+        SELECT requested_item_id, %s FROM exchangerequest WHERE requester_id = %s
+        UNION ALL
+        SELECT offered_item_id, %s FROM exchangerequest
+        WHERE owner_id = %s AND exchange_status = 'Accepted' AND offered_item_id IS NOT NULL
+        """,
+        (
+            DONATED_WEIGHT, LISTED_WEIGHT, user_id,
+            REQUESTED_WEIGHT, user_id,
+            RECEIVED_WEIGHT, user_id,
+        ),
+    )
+    weights = {}
+    for row in cursor.fetchall():
+        weights[row["item_id"]] = weights.get(row["item_id"], 0.0) + float(row["weight"])
+    return weights
+
+
+def refresh(cursor, full=False):
+    """Re-encode every item (full) or only items added since the last refresh"""
+    with _refresh_lock:
+        _refresh(cursor, full)
+
+
+def _refresh(cursor, full):
+    if full or index.loaded_at is None:
+        cursor.execute(f"SELECT {ITEM_COLUMNS} FROM clothing_items")
+        index.rebuild(cursor.fetchall())
+    else:
+        cursor.execute(
+            f"SELECT {ITEM_COLUMNS} FROM clothing_items WHERE item_id > %s",
+            (index.max_item_id,),
+        )
+        index.upsert(cursor.fetchall())
+
+
+def ensure_loaded(cursor):
+    """Build the index on first use if the background job has not yet.
+
+    Concurrent first requests wait for a single build.
+    """
+    if index.loaded_at is not None:
+        return
+    with _refresh_lock:
+        if index.loaded_at is None:
+            _refresh(cursor, True)
+
+
+def start_refresh_thread(interval=RECOMMEND_REFRESH_INTERVAL):
+    """Pick up new items every `interval` seconds and fully rebuild every
+    RECOMMEND_REBUILD_INTERVAL (status and content changes), in a daemon thread"""
+    if interval <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            loaded_at = index.loaded_at
+            full = loaded_at is None or time.monotonic() - loaded_at >= RECOMMEND_REBUILD_INTERVAL
+            try:
+                cnx = acquire_connection()
+                try:
+                    cursor = cnx.cursor(dictionary=True)
+                    refresh(cursor, full=full)
+                    cursor.close()
+                finally:
+                    release_connection(cnx)
+            except Exception as e:
+                print(f"Recommendation index refresh failed: {e}")
+
+    thread = threading.Thread(target=loop, name="recommendation-refresh", daemon=True)
+    thread.start()
+    return thread
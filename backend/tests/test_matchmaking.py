@@ -0,0 +1,60 @@
+import unittest
+from services.matchmaking import REQUEST_WEIGHT, MatchIndex
+
+
+class MatchIndexTest(unittest.TestCase):
+    def setUp(self):
+        # User 10 requested item 1 from user 20; user 20 wishes for Tops,
+        # which user 10 owns (item 2)
+        self.index = MatchIndex()
+        self.index.load(
+            items=[
+                {"item_id": 1, "user_id": 20, "category": "Shoes", "size": "42"},
+                {"item_id": 2, "user_id": 10, "category": "Tops", "size": "M"},
+            ],
+            requests=[
+                {"exchange_id": 100, "requester_id": 10, "owner_id": 20, "requested_item_id": 1},
+            ],
+            wishes=[{"user_id": 20, "category": "Tops", "size": None}],
+        )
+
+    def test_swap_for_requested_item(self):
+        self.assertEqual(self.index.wanted_by(20), {10: REQUEST_WEIGHT})
+        self.assertEqual(self.index.suggestions(10), [[
+            {"giver_id": 20, "receiver_id": 10, "item_id": 1},
+            {"giver_id": 10, "receiver_id": 20, "item_id": 2},
+        ]])
+
+    def test_removed_item_drops_its_requests(self):
+        self.index.remove_item(1)
+        self.assertEqual(self.index.wanted_by(20), {})
+        self.assertEqual(self.index.wanted_from(10), {})
+        for user_id in (10, 20):
+            for trades in self.index.suggestions(user_id):
+                self.assertTrue(all(t["item_id"] is not None for t in trades), trades)
+
+    def test_directions_agree(self):
+        self.index.remove_item(1)
+        self.index.add_item(3, 20, "Tops", None)
+        self.index.add_wish(10, "Tops", None)
+        for user_id in (10, 20):
+            for other, score in self.index.wanted_from(user_id).items():
+                self.assertEqual(self.index.wanted_by(other).get(user_id), score)
+
+    def test_events_during_load_survive_the_snapshot(self):
+        index = MatchIndex()
+        index.begin_load()
+        # Committed after the snapshot was read, so missing from it
+        index.apply({
+            "type": "item", "item_id": 3, "user_id": 30,
+            "category": "Tops", "size": "S", "available": True,
+        })
+        index.apply({"type": "wish", "user_id": 10, "category": "Tops", "size": None, "active": True})
+        index.load(items=[], requests=[], wishes=[])
+        index.end_load()
+        self.assertEqual(index.wanted_from(10), {30: 1})
+        self.assertIsNone(index._changes)
+
+
+if __name__ == "__main__":
+    unittest.main()
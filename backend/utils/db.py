@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from flask import g
+from werkzeug.local import LocalProxy
+from mysql.connector import errors, pooling
+
+DB_POOL_NAME = os.getenv("DB_POOL_NAME", "scep_pool")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # mysql-connector caps this at 32
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+DB_PING_ATTEMPTS = int(os.getenv("DB_PING_ATTEMPTS", "3"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+
+def _get_pool():
+    """Create the connection pool on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=DB_POOL_NAME,
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    host=os.getenv("DB_HOST"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    database=os.getenv("DB_NAME"),
+                )
+    return _pool
+
+
+def acquire_connection(timeout=DB_POOL_TIMEOUT):
+    """Check a healthy connection out of the pool, waiting up to `timeout` seconds"""
+    if not _slots.acquire(timeout=timeout):
+        raise errors.PoolError("Timed out waiting for a database connection")
+
+    try:
+        cnx = _get_pool().get_connection()
+    except Exception:
+        _slots.release()
+        raise
+
+    try:
+        # Reconnects transparently if MySQL dropped the socket after wait_timeout
+        cnx.ping(reconnect=True, attempts=DB_PING_ATTEMPTS, delay=0)
+    except Exception:
+        release_connection(cnx)
+        raise
+    return cnx
+
+
+def release_connection(cnx):
+    """Return a connection to the pool, discarding any uncommitted work"""
+    try:
+        if cnx.in_transaction:
+            cnx.rollback()
+    except Exception:
+        pass
+    finally:
+        try:
+            cnx.close()
+        finally:
+            _slots.release()
+
+
+def _record_db_call(started, statements):
+    g.db_time = g.get("db_time", 0.0) + time.perf_counter() - started
+    if statements:
+        g.db_queries = g.get("db_queries", 0) + statements
+
+
+class TimedCursor:
+    """Cursor wrapper adding each call's duration to the request's totals
+    (g.db_time, g.db_queries), which the metrics middleware records"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            _record_db_call(started, 1)
+
+    def executemany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        finally:
+            _record_db_call(started, 1)
+
+    # Unbuffered cursors read rows from the server while fetching
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchone()
+        finally:
+            _record_db_call(started, 0)
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchmany(*args, **kwargs)
+        finally:
+            _record_db_call(started, 0)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchall()
+        finally:
+            _record_db_call(started, 0)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """A request's pooled connection, handing out TimedCursors"""
+
+    def __init__(self, cnx):
+        self._cnx = cnx
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._cnx.cursor(*args, **kwargs))
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._cnx.commit()
+        finally:
+            _record_db_call(started, 0)
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+
+def get_db():
+    """Get the connection checked out for the current request"""
+    if "db_conn" not in g:
+        g.db_conn = TimedConnection(acquire_connection())
+    return g.db_conn
+
+
+def release_db(exception=None):
+    """Return the current request's connection to the pool early"""
+    cnx = g.pop("db_conn", None)
+    if cnx is not None:
+        release_connection(cnx)
+
+
+def init_db(app):
+    """Register per-request connection teardown on the app"""
+    app.teardown_appcontext(release_db)
+
+
+def pool_stats():
+    """Snapshot of pool usage"""
+    # BoundedSemaphore keeps its free count in _value
+    available = _slots._value
+    return {
+        "size": DB_POOL_SIZE,
+        "in_use": DB_POOL_SIZE - available,
+        "available": available,
+    }
+
+
+# Drop-in replacement for the old module-level connection: every attribute
+# access resolves to the connection checked out for the current request.
+conn = LocalProxy(get_db)
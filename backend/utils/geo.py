@@ -0,0 +1,139 @@
+import math
+
+GEOHASH_PRECISION = 12  # length stored in clothing_items.pickup_geohash
+# The sphere ST_Distance_Sphere uses, so the prefilter box and the exact
+# distance check agree on where the radius ends
+EARTH_RADIUS_KM = 6370.986
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+MAX_RADIUS_KM = 20016  # half the Earth's circumference: covers everything
+
+# k-nearest searches start with this radius and widen it until they have
+# enough rows
+KNN_START_RADIUS_KM = 5
+KNN_GROWTH = 4
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Great-circle distance in km from an item's pickup point; params: (lng, lat).
+# Only rows with a geohash have coordinates ST_Distance_Sphere accepts.
+DISTANCE_SQL = (
+    "IF(pickup_geohash IS NULL, NULL,"
+    " ST_Distance_Sphere(POINT(pickup_longitude, pickup_latitude), POINT(%s, %s)) / 1000)"
+)
+
+
+def valid_coordinates(lat, lng):
+    try:
+        return -90 <= float(lat) <= 90 and -180 <= float(lng) <= 180
+    except (TypeError, ValueError):
+        return False
+
+
+def pickup_geohash(lat, lng):
+    """Geohash to store for an item's pickup point, or None without one"""
+    if lat is None or lng is None or lat == "" or lng == "":
+        return None
+    # Rounded like the DECIMAL(9, 6) columns so the hash matches stored values
+    return encode_geohash(round(float(lat), 6), round(float(lng), 6))
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Standard base32 geohash, the same encoding as MySQL's ST_GeoHash"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            interval[0] = mid
+        else:
+            value *= 2
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value = bits = 0
+    return "".join(chars)
+
+
+def _cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing the search circle.
+
+    Returns None when the circle reaches a pole or crosses the antimeridian;
+    callers then skip the prefilter and rely on the distance check alone.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat < -90 or max_lat > 90:
+        return None
+    # Widest point of the box is the latitude furthest from the equator
+    dlng = dlat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180 or max_lng > 180:
+        return None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def covering_prefixes(box):
+    """Geohash prefixes whose cells together cover `box`.
+
+    Uses the longest prefix whose cell is at least as large as the box in both
+    directions; the box then overlaps at most 2x2 cells, each holding one of
+    its corners. Returns [] if even a one-character cell is too small.
+    """
+    min_lat, max_lat, min_lng, max_lng = box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        if height >= max_lat - min_lat and width >= max_lng - min_lng:
+            return sorted({
+                encode_geohash(corner_lat, corner_lng, precision)
+                for corner_lat in (min_lat, max_lat)
+                for corner_lng in (min_lng, max_lng)
+            })
+    return []
+
+
+def parse_distance_cursor(value):
+    """Parse a "<distance_km>,<item_id>" cursor; returns None if malformed"""
+    try:
+        distance, item_id = value.split(",", 1)
+        return float(distance), int(item_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def distance_cursor(row):
+    """Build the cursor pointing after `row` in a distance-ordered page"""
+    return f"{row['distance_km']!r},{row['item_id']}"
+
+
+def within_radius_sql(lat, lng, radius_km):
+    """WHERE fragment (and params) keeping items within radius_km of a point.
+
+    Geohash prefixes narrow the scan to the cells around the circle, then the
+    exact distance check drops the corners.
+    """
+    if radius_km >= MAX_RADIUS_KM:
+        return "pickup_geohash IS NOT NULL", []
+
+    conditions = []
+    params = []
+    box = bounding_box(lat, lng, radius_km)
+    prefixes = covering_prefixes(box) if box else []
+    if prefixes:
+        conditions.append("(" + " OR ".join(["pickup_geohash LIKE %s"] * len(prefixes)) + ")")
+        params.extend(prefix + "%" for prefix in prefixes)
+    conditions.append(f"{DISTANCE_SQL} <= %s")
+    params.extend([lng, lat, radius_km])
+    return " AND ".join(conditions), params
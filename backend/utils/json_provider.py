@@ -0,0 +1,62 @@
+import datetime
+import decimal
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(o):
+    """Types MySQL rows carry that JSON has no native form for"""
+    if isinstance(o, decimal.Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+        return o.isoformat()
+    if isinstance(o, datetime.timedelta):  # TIME columns
+        return str(o)
+    if isinstance(o, (bytes, bytearray)):
+        return o.decode("utf-8")
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider using orjson when installed.
+
+    Datetimes are written as ISO 8601 and Decimals as numbers in both modes,
+    so routes can hand cursor rows to jsonify() without reformatting them.
+    """
+
+    default = staticmethod(_default)
+
+    def _options(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._options()).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def encode_row(row):
+    """One row as compact JSON bytes, for streamed responses"""
+    if orjson is None:
+        return json.dumps(row, default=_default, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(row, default=_default)
@@ -1,13 +1,38 @@
 import jwt
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
 from flask import current_app
 import os
+from utils.cache import TTLCache
+from utils.db import acquire_connection, release_connection
+from utils.pubsub import bus
 
 # Secret key for JWT - in production, use environment variable
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 15 minutes
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7 days
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', '10000'))
+REVOCATION_SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', '5'))  # seconds
+AUTH_CHANNEL = 'auth'
+# Rows re-read behind the high-water mark on every sync: concurrent
+# revocations can commit out of revocation_id order
+REVOCATION_SYNC_OVERLAP = 100
+
+# Decoded payloads of recently verified tokens, kept until the token's exp,
+# so repeat requests skip the HMAC check. Per-process.
+_verified_tokens = TTLCache(maxsize=JWT_CACHE_SIZE)
+
+# Revoked token digests -> exp. The revoked_tokens table is the shared
+# source of truth; every process mirrors it here. Revocations reach other
+# processes through the pub/sub bus at once, and through the periodic sync
+# within REVOCATION_SYNC_INTERVAL otherwise. Entries are never evicted
+# before their exp: a dropped entry would make the token valid again.
+_revoked_tokens = {}
+_revoked_lock = threading.Lock()
+_revocations_seen = 0  # highest revocation_id mirrored
 
 
 def generate_access_token(user_id, email):
@@ -34,20 +59,130 @@ def generate_refresh_token(user_id, email):
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
 def verify_token(token, token_type='access'):
     """Verify and decode a JWT token"""
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        
-        # Verify token type
-        if payload.get('type') != token_type:
+    key = _token_key(token)
+    if is_revoked(key):
+        return None
+
+    payload = _verified_tokens.get(key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
             return None
-        
-        return payload
-    except jwt.ExpiredSignatureError:
+        _verified_tokens.set(key, payload, expires_at=payload['exp'])
+    
+    # Verify token type
+    if payload.get('type') != token_type:
         return None
+    
+    return payload
+
+
+def is_revoked(key):
+    exp = _revoked_tokens.get(key)
+    return exp is not None and exp > time.time()
+
+
+def _remember_revoked(key, exp):
+    with _revoked_lock:
+        _revoked_tokens[key] = exp
+    _verified_tokens.delete(key)
+
+
+def revoke_token(token):
+    """Reject `token` in every process from now until it expires"""
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
     except jwt.InvalidTokenError:
-        return None
+        return False
+    key = _token_key(token)
+    cnx = acquire_connection()
+    try:
+        cursor = cnx.cursor()
+        cursor.execute(
+            """
+            INSERT INTO revoked_tokens (token_hash, expires_at)
+            VALUES (%s, FROM_UNIXTIME(%s))
+            ON DUPLICATE KEY UPDATE token_hash = token_hash
+            """,
+            (key, payload['exp']),
+        )
+        cnx.commit()
+        cursor.close()
+    finally:
+        release_connection(cnx)
+    _remember_revoked(key, payload['exp'])
+    bus.publish(AUTH_CHANNEL, {'type': 'revoked', 'token_hash': key.hex(), 'exp': payload['exp']})
+    return True
+
+
+def sync_revocations(cnx):
+    """Mirror revocations recorded since the last sync and drop expired ones"""
+    global _revocations_seen
+    cursor = cnx.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT revocation_id, token_hash, UNIX_TIMESTAMP(expires_at) FROM revoked_tokens
+            WHERE revocation_id > %s AND expires_at > NOW()
+            ORDER BY revocation_id
+            """,
+            (max(0, _revocations_seen - REVOCATION_SYNC_OVERLAP),),
+        )
+        for revocation_id, key, exp in cursor.fetchall():
+            _remember_revoked(bytes(key), int(exp))
+            _revocations_seen = max(_revocations_seen, revocation_id)
+
+        now = time.time()
+        with _revoked_lock:
+            for key in [k for k, exp in _revoked_tokens.items() if exp <= now]:
+                del _revoked_tokens[key]
+
+        cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < NOW() LIMIT 1000")
+        cnx.commit()
+    finally:
+        cursor.close()
+
+
+def start_revocation_sync(interval=REVOCATION_SYNC_INTERVAL):
+    """Load the denylist now and keep it in sync, in a daemon thread"""
+
+    def loop():
+        while True:
+            try:
+                cnx = acquire_connection()
+                try:
+                    sync_revocations(cnx)
+                finally:
+                    release_connection(cnx)
+            except Exception as e:
+                print(f"Token revocation sync failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="revocation-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def _on_event(channel, event):
+    if channel == AUTH_CHANNEL and event.get('type') == 'revoked':
+        _remember_revoked(bytes.fromhex(event['token_hash']), event['exp'])
+
+
+bus.add_listener(_on_event)
+
+
+def token_cache_stats():
+    """Hit/miss counters of the verified-token cache"""
+    return _verified_tokens.stats()
 
 
 def get_user_from_token(token):
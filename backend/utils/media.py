@@ -0,0 +1,285 @@
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import Request
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Uploaded images are stored under their SHA-256, so identical uploads share
+# one copy and every URL is immutable:
+#   <MEDIA_ROOT>/<hash[:2]>/<hash>/original.<ext>
+#   <MEDIA_ROOT>/<hash[:2]>/<hash>/<width>.webp and <width>.jpg
+# The original is moved in last, so its presence means the variants exist.
+
+MEDIA_ROOT = os.getenv(
+    "MEDIA_ROOT", os.path.join(os.path.dirname(os.path.dirname(__file__)), "media")
+)
+MEDIA_URL = "/api/media"
+MEDIA_MAX_AGE = 365 * 24 * 3600  # seconds; stored files never change
+MEDIA_MAX_UPLOAD_BYTES = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MEDIA_MAX_PIXELS = 50_000_000
+UPLOAD_ENDPOINT = "media_bp.upload_image"
+
+THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+LIST_THUMBNAIL_WIDTH = 320
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Accepted upload formats and the extension their original is stored under
+FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 2)))
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", str(IMAGE_WORKERS * 2)))  # in-flight + queued
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "60"))  # seconds
+# Temporary upload files older than this are left over from crashed
+# processes and are removed by sweep_stale_uploads()
+UPLOAD_TMP_MAX_AGE = 3600  # seconds
+UPLOAD_SWEEP_INTERVAL = 600  # seconds
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_MEDIA_URL_RE = re.compile(rf"^{re.escape(MEDIA_URL)}/([0-9a-f]{{2}}/[0-9a-f]{{64}})/original\.[a-z]+$")
+_MEDIA_PATH_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}/(original\.[a-z]+|\d+\.(webp|jpg))$")
+
+_executor = None
+_executor_lock = threading.Lock()
+_admission = threading.BoundedSemaphore(IMAGE_QUEUE_LIMIT)
+_last_sweep = 0.0
+
+
+class UnsupportedImage(Exception):
+    """Raised when an upload is not an image we accept"""
+
+
+class ImageBusy(Exception):
+    """Raised when the image processing pool's queue is full"""
+
+
+class HashingFile:
+    """Temporary upload file that hashes its contents as they are written"""
+
+    def __init__(self):
+        os.makedirs(_tmp_dir(), exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=_tmp_dir(), prefix="upload-", delete=False)
+        self.sha256 = hashlib.sha256()
+        self.busy = None  # future of a render still reading the file
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def discard(self):
+        """Close and remove the file unless it was moved into the store.
+
+        A render that timed out may still be reading it; the file is then
+        removed once that render finishes.
+        """
+        self.file.close()
+        if self.busy is not None:
+            self.busy.add_done_callback(lambda _: self._unlink())
+        else:
+            self._unlink()
+
+    def _unlink(self):
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class MediaRequest(Request):
+    """Request class that streams image uploads straight to disk.
+
+    Werkzeug's form parser writes each file part into the stream returned by
+    _get_file_stream(), so the upload endpoint gets a file on the media
+    volume, already hashed, without holding the body in memory. Every file
+    created is removed in close(), which Flask calls when the request ends,
+    including parts the view never looked at and bodies cut off mid-parse.
+    """
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == UPLOAD_ENDPOINT:
+            return MEDIA_MAX_UPLOAD_BYTES
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint == UPLOAD_ENDPOINT:
+            upload = HashingFile()
+            self.__dict__.setdefault("_uploads", []).append(upload)
+            return upload
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for upload in self.__dict__.pop("_uploads", ()):
+                upload.discard()
+
+
+def _tmp_dir():
+    return os.path.join(MEDIA_ROOT, "tmp")
+
+
+def sweep_stale_uploads():
+    """Remove temporary upload files left behind by crashed processes.
+
+    Runs at most every UPLOAD_SWEEP_INTERVAL seconds; cheap to call per upload.
+    """
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep < UPLOAD_SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+    for path in glob.glob(os.path.join(_tmp_dir(), "upload-*")):
+        try:
+            if now - os.path.getmtime(path) > UPLOAD_TMP_MAX_AGE:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _image_dir(digest):
+    return os.path.join(MEDIA_ROOT, digest[:2], digest)
+
+
+def _stored_original(digest):
+    """Path of a stored image's original, or None"""
+    found = glob.glob(os.path.join(_image_dir(digest), "original.*"))
+    return found[0] if found else None
+
+
+def _save(image, path, fmt, **options):
+    """Write atomically, so a concurrent upload of the same image never sees half a file"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp, fmt, **options)
+    os.replace(tmp, path)
+
+
+def _flatten(image):
+    """RGB copy for JPEG, with transparency composited onto white"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _render(source, directory, widths):
+    """Validate an upload and write its resized WebP and JPEG variants.
+
+    Runs in the process pool. Variants are never upscaled: widths beyond
+    the original's are written at its own size. Returns the image format.
+    """
+    try:
+        with Image.open(source) as original:
+            fmt = original.format
+            if fmt not in FORMATS:
+                raise UnsupportedImage(f"Unsupported image format: {fmt}")
+            if original.width * original.height > MEDIA_MAX_PIXELS:
+                raise UnsupportedImage("Image dimensions are too large")
+            # JPEGs decode at a reduced scale when that is still big enough
+            original.draft(None, (max(widths), max(widths)))
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info or "A" in image.mode else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise UnsupportedImage(f"Not a valid image: {e}")
+
+    os.makedirs(directory, exist_ok=True)
+    for width in sorted(widths, reverse=True):
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            # Each size is resized from the next larger one, which is cheaper
+            image = image.resize((width, height), Image.LANCZOS)
+        _save(image, os.path.join(directory, f"{width}.webp"), "WEBP", quality=WEBP_QUALITY, method=4)
+        _save(
+            _flatten(image), os.path.join(directory, f"{width}.jpg"), "JPEG",
+            quality=JPEG_QUALITY, optimize=True, progressive=True,
+        )
+    return fmt
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def _submit(fn, *args):
+    """Queue an image call in the process pool, refusing work when saturated"""
+    if not _admission.acquire(blocking=False):
+        raise ImageBusy("Image processing queue is full")
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _admission.release()
+        raise
+    # Held until the render itself finishes, even if the caller stops waiting
+    future.add_done_callback(lambda _: _admission.release())
+    return future
+
+
+def store_image(upload):
+    """Store an uploaded HashingFile under its content hash; returns the hash.
+
+    Uploading bytes that are already stored reuses the existing files.
+    """
+    upload.file.flush()
+    digest = upload.sha256.hexdigest()
+    if _stored_original(digest):
+        return digest
+
+    directory = _image_dir(digest)
+    upload.busy = _submit(_render, upload.file.name, directory, THUMBNAIL_WIDTHS)
+    fmt = upload.busy.result(timeout=IMAGE_TIMEOUT)
+    upload.file.close()
+    os.replace(upload.file.name, os.path.join(directory, f"original.{FORMATS[fmt]}"))
+    return digest
+
+
+def image_url(digest):
+    """URL of a stored image's original, or None if no such image was uploaded"""
+    if not _HASH_RE.match(digest or ""):
+        return None
+    path = _stored_original(digest)
+    if not path:
+        return None
+    return f"{MEDIA_URL}/{digest[:2]}/{digest}/{os.path.basename(path)}"
+
+
+def is_media_path(filename):
+    """True for paths under MEDIA_ROOT that are stored images or variants"""
+    return bool(_MEDIA_PATH_RE.match(filename))
+
+
+def image_variants(url):
+    """(thumbnail_url, srcset) for an image URL.
+
+    srcset maps "webp" and "jpeg" to <img srcset> strings. Images hosted
+    elsewhere have no variants: the URL itself is the thumbnail.
+    """
+    match = _MEDIA_URL_RE.match(url or "")
+    if not match:
+        return url, None
+    base = f"{MEDIA_URL}/{match.group(1)}"
+    return f"{base}/{LIST_THUMBNAIL_WIDTH}.jpg", {
+        "webp": ", ".join(f"{base}/{w}.webp {w}w" for w in THUMBNAIL_WIDTHS),
+        "jpeg": ", ".join(f"{base}/{w}.jpg {w}w" for w in THUMBNAIL_WIDTHS),
+    }
+
+
+def add_image_variants(row, key="image_url", prefix=""):
+    """Add <prefix>thumbnail_url and <prefix>srcset for the image in row[key]"""
+    row[prefix + "thumbnail_url"], row[prefix + "srcset"] = image_variants(row.get(key))
+    return row
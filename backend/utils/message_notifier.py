@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from utils.pubsub import bus
+
+# Wakes long-polling readers when a message is sent. Message events arrive
+# through the pub/sub bus, so with a shared broker backend readers in other
+# worker processes are woken too; otherwise they re-query when their wait
+# times out.
+
+# Conversations remembered in _latest; the least recently active are
+# forgotten, which at worst costs a waiting reader one extra query
+LATEST_LIMIT = 10000
+
+_lock = threading.Lock()
+_latest = OrderedDict()  # conversation_id -> newest message_id seen by this process
+_conditions = {}  # conversation_id -> (Condition, waiter count)
+
+
+def notify_message(conversation_id, message_id):
+    """Record a new message and wake readers waiting on its conversation"""
+    conversation_id = int(conversation_id)
+    with _lock:
+        if message_id > _latest.get(conversation_id, 0):
+            _latest[conversation_id] = message_id
+            _latest.move_to_end(conversation_id)
+            while len(_latest) > LATEST_LIMIT:
+                _latest.popitem(last=False)
+        entry = _conditions.get(conversation_id)
+        if entry:
+            entry[0].notify_all()
+
+
+def wait_for_message(conversation_id, after_id, timeout):
+    """Block until a message newer than `after_id` is sent or `timeout` passes.
+
+    Returns True if woken by a new message.
+    """
+    conversation_id = int(conversation_id)
+    with _lock:
+        condition, waiters = _conditions.get(conversation_id) or (threading.Condition(_lock), 0)
+        _conditions[conversation_id] = (condition, waiters + 1)
+        try:
+            return condition.wait_for(
+                lambda: _latest.get(conversation_id, 0) > after_id, timeout
+            )
+        finally:
+            condition, waiters = _conditions[conversation_id]
+            if waiters == 1:
+                del _conditions[conversation_id]
+            else:
+                _conditions[conversation_id] = (condition, waiters - 1)
+
+
+def _on_event(channel, event):
+    if channel.startswith("conversation:") and event.get("type") == "message":
+        notify_message(event["conversation_id"], event["message_id"])
+
+
+bus.add_listener(_on_event)
@@ -0,0 +1,238 @@
+import os
+import re
+from mysql.connector import errorcode, errors
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+MIGRATION_LOCK = "scep_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60  # seconds
+
+# Errors raised when a statement's effect is already present. DDL in MySQL
+# commits implicitly, so a migration interrupted half-way (or a database
+# created by hand before the runner existed) is re-run statement by statement
+# and these are skipped.
+_ALREADY_APPLIED = {
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_FK_DUP_NAME,
+    errorcode.ER_CANT_DROP_FIELD_OR_KEY,
+}
+
+_FILENAME_RE = re.compile(r"^(\d{4})_[\w-]+\.sql$")
+
+# Representative queries for every hot route, checked with EXPLAIN by
+# check_query_plans(). Keep in sync with the handlers in routes/.
+ROUTE_QUERIES = [
+    (
+        "clothing.get_clothes",
+        "SELECT item_id FROM clothing_items WHERE item_id < %s ORDER BY item_id DESC LIMIT 51",
+        (1000,),
+    ),
+    (
+        "clothing.get_clothes (search)",
+        "SELECT item_id FROM clothing_items"
+        " WHERE MATCH(title, description) AGAINST (%s IN BOOLEAN MODE) LIMIT 51",
+        ("+shirt*",),
+    ),
+    (
+        "clothing.get_clothes (nearby)",
+        "SELECT item_id FROM clothing_items"
+        " WHERE (pickup_geohash LIKE %s OR pickup_geohash LIKE %s) LIMIT 51",
+        ("tdr1%", "tdr4%"),
+    ),
+    (
+        "clothing.get_clothes_facets",
+        "SELECT category, size, item_condition, item_status, COUNT(*) FROM clothing_items"
+        " GROUP BY category, size, item_condition, item_status",
+        (),
+    ),
+    (
+        "users.get_user_by_id (items)",
+        "SELECT item_id FROM clothing_items WHERE user_id = %s ORDER BY item_id DESC",
+        (1,),
+    ),
+    (
+        "users.get_my_items",
+        "SELECT item_id FROM clothing_items WHERE user_id = %s AND item_status = 'Available'",
+        (1,),
+    ),
+    (
+        "users.login",
+        "SELECT user_id FROM users WHERE email = %s",
+        ("someone@example.com",),
+    ),
+    (
+        "exchange.create_exchange_request (duplicate check)",
+        "SELECT exchange_id FROM exchangerequest"
+        " WHERE requester_id = %s AND requested_item_id = %s AND exchange_status = 'Pending'",
+        (1, 1),
+    ),
+    (
+        "exchange.get_exchange_requests (received)",
+        "SELECT exchange_id FROM exchangerequest WHERE owner_id = %s ORDER BY request_date DESC",
+        (1,),
+    ),
+    (
+        "exchange.get_exchange_requests (sent)",
+        "SELECT exchange_id FROM exchangerequest WHERE requester_id = %s ORDER BY request_date DESC",
+        (1,),
+    ),
+    (
+        "conversation.get_messages",
+        "SELECT message_id FROM Messages WHERE conversation_id = %s ORDER BY timestamp ASC",
+        (1,),
+    ),
+    (
+        "conversation.create_conversation",
+        "SELECT conversation_id FROM Conversations"
+        " WHERE (user1_id = %s AND user2_id = %s) OR (user1_id = %s AND user2_id = %s)",
+        (1, 2, 2, 1),
+    ),
+    (
+        "conversation.get_messages (list)",
+        "SELECT c.conversation_id FROM Conversations c WHERE c.user1_id = %s"
+        " UNION ALL SELECT c.conversation_id FROM Conversations c WHERE c.user2_id = %s",
+        (1, 1),
+    ),
+    (
+        "conversation.get_conversations",
+        "SELECT c.conversation_id, r.unread_count FROM Conversations c"
+        " LEFT JOIN conversation_reads r"
+        " ON r.user_id = c.user1_id AND r.conversation_id = c.conversation_id"
+        " WHERE c.user1_id = %s",
+        (1,),
+    ),
+    (
+        "conversation.mark_conversation_read (unread count)",
+        "SELECT COUNT(*) FROM Messages"
+        " WHERE conversation_id = %s AND message_id > %s AND sender_id != %s",
+        (1, 0, 1),
+    ),
+    (
+        "eco_points.get_transactions",
+        "SELECT transaction_id FROM eco_point_transaction"
+        " WHERE user_id = %s ORDER BY transaction_date DESC LIMIT 50",
+        (1,),
+    ),
+    (
+        "jobs.claim",
+        "SELECT job_id FROM jobs WHERE status = 'Pending' AND run_at <= NOW(3)"
+        " ORDER BY run_at LIMIT 1",
+        (),
+    ),
+    (
+        "donation.get_donations",
+        "SELECT donation_id FROM donation WHERE donor_id = %s ORDER BY donation_date DESC",
+        (1,),
+    ),
+]
+
+
+def discover_migrations():
+    """List (version, path) for every migration file, in version order"""
+    migrations = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if _FILENAME_RE.match(name):
+            migrations.append((name[:-4], os.path.join(MIGRATIONS_DIR, name)))
+    return migrations
+
+
+def split_statements(sql):
+    """Split a migration file into statements on trailing semicolons"""
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("--"):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(255) PRIMARY KEY,
+            applied_at DATETIME NOT NULL
+        )
+        """
+    )
+
+
+def applied_versions(cnx):
+    """Versions already recorded in schema_migrations"""
+    cursor = cnx.cursor()
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return versions
+
+
+def run_migrations(cnx, log=print):
+    """Apply every pending migration; safe to call on each startup"""
+    cursor = cnx.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("Timed out waiting for the schema migration lock")
+
+    applied = []
+    try:
+        done = applied_versions(cnx)
+        for version, path in discover_migrations():
+            if version in done:
+                continue
+
+            with open(path, encoding="utf-8") as f:
+                statements = split_statements(f.read())
+
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except errors.DatabaseError as e:
+                    if e.errno not in _ALREADY_APPLIED:
+                        raise
+                    log(f"{version}: skipping, already applied ({e.msg})")
+
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, applied_at) VALUES (%s, NOW())",
+                (version,),
+            )
+            cnx.commit()
+            applied.append(version)
+            log(f"Applied migration {version}")
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+
+    return applied
+
+
+def check_query_plans(cnx):
+    """EXPLAIN each route query and report those with no usable index.
+
+    Returns a list of (name, table) pairs where MySQL would scan the whole
+    table because no index applies. A full scan that MySQL picks only because
+    the table is tiny (possible_keys still set) is not reported.
+    """
+    problems = []
+    cursor = cnx.cursor(dictionary=True)
+    for name, query, params in ROUTE_QUERIES:
+        cursor.execute("EXPLAIN " + query, params)
+        for row in cursor.fetchall():
+            table = row.get("table") or ""
+            # <unionM,N> / <derivedN> rows are temporary results, not base tables
+            if table.startswith("<"):
+                continue
+            if row.get("type") == "ALL" and not row.get("possible_keys"):
+                problems.append((name, table))
+    cursor.close()
+    return problems
@@ -0,0 +1,68 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 4)))  # in-flight + queued
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "10"))  # seconds
+
+_executor = None
+_executor_lock = threading.Lock()
+_admission = threading.BoundedSemaphore(HASH_QUEUE_LIMIT)
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool's queue is full"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password, hashed)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _executor
+
+
+def _run(fn, *args):
+    """Run a bcrypt call in the process pool, refusing work when saturated"""
+    if not _admission.acquire(blocking=False):
+        raise HasherBusy("Password hashing queue is full")
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _admission.release()
+        raise
+    # The slot is held until the job itself finishes, not until we stop
+    # waiting for it: a timed-out job still occupies the pool
+    future.add_done_callback(lambda _: _admission.release())
+    return future.result(timeout=HASH_TIMEOUT)
+
+
+def hash_password(password):
+    """Hash a password with the configured cost factor"""
+    return _run(_hash, password.encode("utf-8"), BCRYPT_LOG_ROUNDS).decode("utf-8")
+
+
+def check_password(hashed, password):
+    """Check a password against a stored bcrypt hash"""
+    return _run(_check, hashed.encode("utf-8"), password.encode("utf-8"))
+
+
+def needs_rehash(hashed):
+    """True if the hash was made with a different cost factor than configured"""
+    try:
+        # $2b$<rounds>$<salt+hash>
+        return int(hashed.split("$")[2]) != BCRYPT_LOG_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,171 @@
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # only needed for PUBSUB_BACKEND=redis
+    redis = None
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local")  # local, redis
+PUBSUB_URL = os.getenv("PUBSUB_URL", "redis://localhost:6379/0")
+PUBSUB_PREFIX = "scep:"
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A queue of events published to a set of channels"""
+
+    def __init__(self, bus, channels):
+        self.bus = bus
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, channel, event):
+        try:
+            self.queue.put_nowait((channel, event))
+        except queue.Full:
+            # A stalled client must not block publishers; it will resync
+            # from the REST endpoints when it reconnects
+            pass
+
+    def get(self, timeout=None):
+        """Next (channel, event), or None if nothing arrives within `timeout`"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class LocalBackend:
+    """Delivers events only to subscribers in this process"""
+
+    def __init__(self):
+        self.dispatch = None
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, channel, event):
+        self.dispatch(channel, event)
+
+
+class RedisBackend:
+    """Fans events out to every worker through a Redis-compatible broker"""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("PUBSUB_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.dispatch = None
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+        listener = threading.Thread(target=self._listen, name="pubsub-listener", daemon=True)
+        listener.start()
+
+    def publish(self, channel, event):
+        self.client.publish(PUBSUB_PREFIX + channel, json.dumps(event))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(PUBSUB_PREFIX + "*")
+                for message in pubsub.listen():
+                    # A malformed message must not stop the listener
+                    try:
+                        channel = message["channel"].decode("utf-8")[len(PUBSUB_PREFIX):]
+                        event = json.loads(message["data"])
+                    except Exception as e:
+                        print(f"Pub/sub dropped a malformed message: {e}")
+                        continue
+                    self.dispatch(channel, event)
+            except redis.ConnectionError as e:
+                print(f"Pub/sub broker connection lost, retrying: {e}")
+                time.sleep(1)
+            except Exception as e:
+                print(f"Pub/sub listener error, resubscribing: {e}")
+                time.sleep(1)
+
+
+class EventBus:
+    """In-process pub/sub with a pluggable cross-process backend"""
+
+    def __init__(self, backend):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of Subscription
+        self._listeners = []
+        self.backend = backend
+        backend.start(self._dispatch)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def add_listener(self, callback):
+        """Call `callback(channel, event)` for every event on every channel"""
+        self._listeners.append(callback)
+
+    def publish(self, channel, event):
+        self.backend.publish(channel, event)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def _dispatch(self, channel, event):
+        """Deliver to every subscriber and listener; one failing never affects
+        the others, nor the publisher (which has already committed)"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(channel, event)
+            except Exception as e:
+                print(f"Pub/sub delivery on {channel} failed: {e}")
+        for callback in self._listeners:
+            try:
+                callback(channel, event)
+            except Exception as e:
+                print(f"Pub/sub listener {getattr(callback, '__qualname__', callback)} failed on {channel}: {e}")
+
+
+def _create_backend():
+    if PUBSUB_BACKEND == "redis":
+        return RedisBackend(PUBSUB_URL)
+    return LocalBackend()
+
+
+bus = EventBus(_create_backend())
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def conversation_channel(conversation_id):
+    return f"conversation:{conversation_id}"
+
+
+def publish_to_users(user_ids, event):
+    """Publish an event to each user's channel (call after commit)"""
+    for user_id in set(user_ids):
+        bus.publish(user_channel(user_id), event)
@@ -0,0 +1,268 @@
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, g, request
+from werkzeug.http import generate_etag
+from middleware.etag import not_modified
+from utils.streaming import wants_ndjson
+from utils.cache import TTLCache
+from utils.pubsub import bus
+
+try:
+    import redis
+except ImportError:  # only needed for RESPONSE_CACHE_BACKEND=redis
+    redis = None
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory, redis
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/1")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))  # seconds
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+# Tag versions the memory backend remembers; least recently used ones are
+# forgotten beyond this
+RESPONSE_CACHE_TAGS = int(os.getenv("RESPONSE_CACHE_TAGS", str(RESPONSE_CACHE_SIZE * 4)))
+RESPONSE_CACHE_PREFIX = "scep:rc:"
+CACHE_CHANNEL = "cache"
+# Tells this process's own invalidation events apart from other processes'
+_ORIGIN = uuid.uuid4().hex
+
+# Entries record the version of each of their tags when stored. Invalidating a
+# tag bumps its version, which makes every entry stored under the old version
+# a miss without having to find and delete those entries.
+
+
+class MemoryBackend:
+    """Per-process LRU/TTL store"""
+
+    shared = False
+
+    def __init__(self, maxsize, max_tags=RESPONSE_CACHE_TAGS):
+        self.entries = TTLCache(maxsize=maxsize)
+        self.max_tags = max_tags
+        # Versions come from one counter and only ever grow. A forgotten tag
+        # reads as _floor, the highest version forgotten so far: an entry
+        # stored before the tag's last bump can never match it again, so
+        # forgetting only ever causes extra misses, never stale hits.
+        self._versions = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry, ttl):
+        self.entries.set(key, entry, ttl=ttl)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            versions = {}
+            for tag in tags:
+                version = self._versions.get(tag)
+                if version is None:
+                    version = self._floor
+                else:
+                    self._versions.move_to_end(tag)
+                versions[tag] = version
+            return versions
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._counter += 1
+                self._versions[tag] = self._counter
+                self._versions.move_to_end(tag)
+            while len(self._versions) > self.max_tags:
+                _, version = self._versions.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+
+class RedisBackend:
+    """Store shared by every worker in a Redis-compatible server"""
+
+    shared = True
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(RESPONSE_CACHE_PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, entry, ttl):
+        self.client.set(RESPONSE_CACHE_PREFIX + key, json.dumps(entry), ex=ttl)
+
+    def tag_versions(self, tags):
+        tags = list(tags)
+        if not tags:
+            return {}
+        values = self.client.mget([RESPONSE_CACHE_PREFIX + "tag:" + t for t in tags])
+        return {tag: int(v or 0) for tag, v in zip(tags, values)}
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(RESPONSE_CACHE_PREFIX + "tag:" + tag)
+        pipe.execute()
+
+
+class ResponseCache:
+    """Tag-invalidated cache of rendered responses"""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is not None and self.backend.tag_versions(entry["tags"]) == entry["tags"]:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def tag_versions(self, tags):
+        return self.backend.tag_versions(set(tags))
+
+    def set(self, key, body, status, mimetype, tag_versions, ttl=None):
+        """Store a response valid while every tag is still at `tag_versions`"""
+        entry = {
+            "body": body,
+            "etag": generate_etag(body.encode("utf-8")),
+            "status": status,
+            "mimetype": mimetype,
+            "tags": tag_versions,
+        }
+        self.backend.set(key, entry, ttl or self.ttl)
+
+    def invalidate(self, *tags):
+        """Make entries under `tags` stale in this process and, for a
+        per-process backend, in every other process sharing the pub/sub bus
+        (web workers and `python worker.py` job workers alike)"""
+        tags = {t for t in tags if t}
+        if tags:
+            self.backend.bump(tags)
+            if not self.backend.shared:
+                bus.publish(CACHE_CHANNEL, {"type": "invalidate", "origin": _ORIGIN, "tags": sorted(tags)})
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _create_backend():
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisBackend(RESPONSE_CACHE_URL)
+    return MemoryBackend(RESPONSE_CACHE_SIZE)
+
+
+response_cache = ResponseCache(_create_backend(), RESPONSE_CACHE_TTL)
+
+
+def _on_event(channel, event):
+    if channel == CACHE_CHANNEL and event.get("origin") != _ORIGIN:
+        response_cache.backend.bump(event["tags"])
+
+
+bus.add_listener(_on_event)
+
+
+def cache_key():
+    """Key for the current request: endpoint, view args and sorted query args"""
+    args = sorted((k, v) for k, values in request.args.lists() for v in values)
+    view_args = sorted((request.view_args or {}).items())
+    return json.dumps([request.endpoint, view_args, args], separators=(",", ":"))
+
+
+def add_cache_tags(*tags):
+    """Tag the response being built with data it depends on"""
+    g.setdefault("cache_tags", set()).update(t for t in tags if t)
+
+
+def cached_response(tags, ttl=None):
+    """Cache successful responses of a public GET view.
+
+    `tags(view_args, args)` returns the tags known from the request; the view
+    can add tags that depend on its result with add_cache_tags().
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # Streamed responses are never buffered, so never cached
+            if wants_ndjson():
+                return f(*args, **kwargs)
+
+            key = cache_key()
+            entry = response_cache.get(key)
+            if entry is not None:
+                if not_modified(entry["etag"]):
+                    response = Response(status=304)
+                else:
+                    response = Response(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+                response.set_etag(entry["etag"])
+                return response
+
+            # Versions are read before the view runs, so a write that lands
+            # while it is rendering leaves the stored entry already stale
+            versions = response_cache.tag_versions(tags(kwargs, request.args))
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                extra = g.get("cache_tags", set()) - versions.keys()
+                versions.update(response_cache.tag_versions(extra))
+                response_cache.set(
+                    key,
+                    response.get_data(as_text=True),
+                    response.status_code,
+                    response.mimetype,
+                    versions,
+                    ttl,
+                )
+            return response
+
+        return decorated
+
+    return decorator
+
+
+def item_tag(item_id):
+    return f"item:{item_id}"
+
+
+def user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def category_tag(category):
+    return f"clothes:category:{category}"
+
+
+# Listings that are not restricted to one category
+ALL_CLOTHES_TAG = "clothes:all"
+
+
+def invalidate_items(items):
+    """Invalidate everything derived from the given clothing_items rows.
+
+    Each row needs item_id, user_id and category.
+    """
+    tags = {ALL_CLOTHES_TAG}
+    for item in items:
+        tags.update({
+            item_tag(item["item_id"]),
+            user_tag(item["user_id"]),
+            category_tag(item["category"]),
+        })
+    response_cache.invalidate(*tags)
@@ -0,0 +1,38 @@
+import re
+
+# InnoDB ignores tokens shorter than innodb_ft_min_token_size (default 3)
+FT_MIN_TOKEN_SIZE = 3
+FT_MAX_TERMS = 8
+
+# Matches the columns of ft_clothing_items_title_description
+CLOTHING_MATCH = "MATCH(title, description) AGAINST (%s IN BOOLEAN MODE)"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_boolean_query(search):
+    """Turn free text into a BOOLEAN MODE query requiring every term as a prefix.
+
+    Returns None when no term is long enough for the full-text index, in which
+    case callers should fall back to a plain LIKE filter.
+    """
+    terms = [t for t in _TOKEN_RE.findall(search or "") if len(t) >= FT_MIN_TOKEN_SIZE]
+    if not terms:
+        return None
+    return " ".join(f"+{t}*" for t in terms[:FT_MAX_TERMS])
+
+
+def parse_relevance_cursor(value):
+    """Parse a "<relevance>,<item_id>" cursor; returns None if malformed"""
+    try:
+        score, item_id = value.split(",", 1)
+        return float(score), int(item_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def relevance_cursor(row):
+    """Build the cursor pointing after `row` in a relevance-ordered page"""
+    # repr() round-trips the double exactly, so the next page's comparison
+    # against MATCH() is exact
+    return f"{row['relevance']!r},{row['item_id']}"
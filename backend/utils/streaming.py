@@ -0,0 +1,54 @@
+from flask import Response, request, stream_with_context
+from utils.db import conn
+from utils.json_provider import encode_row
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson():
+    """True if the client asked for a streamed NDJSON response"""
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def iter_rows(query, params, transform=None, batch_size=STREAM_BATCH_SIZE):
+    """Yield result rows batch by batch from an unbuffered cursor.
+
+    Only one batch is held in memory at a time. The connection cannot run
+    other statements until the generator finishes, so it is drained and the
+    cursor closed even if the client disconnects mid-stream.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from (map(transform, rows) if transform else rows)
+    finally:
+        if conn.unread_result:
+            conn.consume_results()
+        cursor.close()
+
+
+def ndjson_response(rows, headers=None):
+    """Stream an iterable of rows as NDJSON, one JSON object per line"""
+
+    def generate():
+        batch = []
+        try:
+            for row in rows:
+                batch.append(encode_row(row))
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    yield b"\n".join(batch) + b"\n"
+                    batch = []
+            if batch:
+                yield b"\n".join(batch) + b"\n"
+        finally:
+            # Runs iter_rows' cleanup now rather than at garbage collection
+            if hasattr(rows, "close"):
+                rows.close()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
@@ -0,0 +1,49 @@
+"""Background job worker CLI.
+
+    python worker.py         run one worker process per CPU
+    python worker.py 4       run 4 worker processes
+
+Set JOB_WORKERS=0 on the web processes when jobs run here instead.
+
+Run with PUBSUB_BACKEND=redis (or RESPONSE_CACHE_BACKEND=redis): jobs
+invalidate cached responses, such as profiles after a balance change, and
+only a shared broker carries that to the web processes. Without one, those
+responses stay stale for up to RESPONSE_CACHE_TTL. The broker also wakes
+workers as soon as a job is enqueued; otherwise they pick jobs up within
+JOB_POLL_INTERVAL seconds.
+"""
+import multiprocessing
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services import jobs
+from services import ledger  # noqa: F401  registers its job handlers
+
+
+def main(argv):
+    try:
+        processes = int(argv[1]) if len(argv) > 1 else os.cpu_count() or 2
+    except ValueError:
+        print(__doc__)
+        return 2
+
+    workers = [
+        multiprocessing.Process(target=jobs.run_worker, name=f"job-worker-{i}")
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
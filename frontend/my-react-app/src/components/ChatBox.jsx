@@ -6,27 +6,51 @@ export default function ChatBox({ conversationId }) {
   const [text, setText] = useState('');
   const listRef = useRef(null);
 
-  // Load messages when conversation changes
-  const loadMessages = async () => {
-    if (!conversationId) return;
-    try {
-      const { data } = await api.get(`/messages?conversation_id=${conversationId}`);
-      setMessages(data || []);
-      setTimeout(() => listRef.current?.scrollTo(0, listRef.current.scrollHeight), 0);
-    } catch (err) {
-      console.error("Error loading messages:", err);
-    }
+  const lastIdRef = useRef(0);
+
+  const mergeMessages = (incoming) => {
+    if (!incoming?.length) return;
+    setMessages((m) => {
+      const seen = new Set(m.map((msg) => msg.id));
+      return [...m, ...incoming.filter((msg) => !seen.has(msg.id))];
+    });
+    lastIdRef.current = Math.max(lastIdRef.current, ...incoming.map((msg) => msg.id));
+    setTimeout(() => listRef.current?.scrollTo(0, listRef.current.scrollHeight), 0);
   };
 
+  // Load history once, then long-poll for messages newer than the last one seen
   useEffect(() => {
-    loadMessages();
-    
-    // Poll for new messages every 3 seconds
-    const interval = setInterval(() => {
-      loadMessages();
-    }, 3000);
+    if (!conversationId) return;
+    let cancelled = false;
+    setMessages([]);
+    lastIdRef.current = 0;
+
+    const poll = async () => {
+      try {
+        const { data } = await api.get(`/messages?conversation_id=${conversationId}`);
+        if (cancelled) return;
+        mergeMessages(data || []);
+      } catch (err) {
+        console.error("Error loading messages:", err);
+      }
+
+      while (!cancelled) {
+        try {
+          const { data } = await api.get(
+            `/messages?conversation_id=${conversationId}&since_id=${lastIdRef.current}&wait=25`
+          );
+          if (!cancelled) mergeMessages(data || []);
+        } catch (err) {
+          console.error("Error polling messages:", err);
+          await new Promise((resolve) => setTimeout(resolve, 3000));
+        }
+      }
+    };
+    poll();
 
-    return () => clearInterval(interval);
+    return () => {
+      cancelled = true;
+    };
   }, [conversationId]);
 
   const sendMessage = async (e) => {
@@ -34,9 +58,8 @@ export default function ChatBox({ conversationId }) {
     if (!text.trim()) return;
     try {
       const { data } = await api.post('/messages', { conversation_id: conversationId, text });
-      setMessages((m) => [...m, data]);
+      mergeMessages([data]);
       setText('');
-      setTimeout(() => listRef.current?.scrollTo(0, listRef.current.scrollHeight), 0);
     } catch (err) {
       console.error("Error sending message:", err);
     }
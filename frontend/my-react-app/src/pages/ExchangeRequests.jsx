@@ -5,17 +5,20 @@ import { toast } from "react-hot-toast";
 
 export default function ExchangeRequests() {
   const [requests, setRequests] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  const load = async () => {
+  // The list is paged; `cursor` continues after the last loaded request
+  const load = async (cursor = null) => {
     try {
-      const { data } = await api.get("/exchange");
-      const allReqs = data?.requests || data || [];
-      // Remove the incorrect filter - backend returns proper exchange requests
-      setRequests(allReqs);
+      const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const { data } = await api.get(`/exchange${params}`);
+      const page = data?.requests || data || [];
+      setRequests((prev) => (cursor ? [...prev, ...page] : page));
+      setNextCursor(data?.next_cursor || null);
     } catch (err) {
       console.error("Error loading exchange requests:", err);
       toast.error("Failed to load exchange requests");
-      setRequests([]);
+      if (!cursor) setRequests([]);
     }
   };
 
@@ -47,6 +50,16 @@ export default function ExchangeRequests() {
           />
         ))}
       </div>
+      {nextCursor && (
+        <div className="flex justify-center">
+          <button
+            onClick={() => load(nextCursor)}
+            className="px-3 py-2 rounded bg-white/10 hover:bg-white/20"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 }
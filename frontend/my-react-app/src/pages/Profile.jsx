@@ -22,7 +22,7 @@ useEffect(() => {
     try {
       await refreshEcoPoints();
       const { data } = await api.get("/exchange?status=Accepted");
-      setCompleted(data?.exchanges || []);
+      setCompleted(data?.requests || []);
     } catch (err) {
       console.error("Failed to load profile data:", err);
     }
@@ -68,7 +68,7 @@ useEffect(() => {
           <ul className="space-y-2">
             {completed.map((ex) => (
               <li key={ex.id} className="border-b border-white/10 pb-2 text-white/80">
-                <span className="font-medium text-white">{ex.item_title}</span>{" "}
+                <span className="font-medium text-white">{ex.requested_title}</span>{" "}
                 with <span className="text-brand-400">{ex.partner_name}</span>
               </li>
             ))}